@@ -2,119 +2,163 @@ import os
 import json
 import base64
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, session, redirect, url_for
+from flask import Flask, Blueprint, request, jsonify, session, redirect, url_for, Response
 from flask_cors import CORS
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-import google.generativeai as genai
-from supabase.client import create_client, Client
 import logging
-from cryptography.fernet import Fernet
 import secrets
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type, wait_exponential
-from google.api_core import exceptions
+import hashlib
+from tenacity import retry, stop_after_attempt, retry_if_exception, wait_exponential
 import time
+import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from contextlib import contextmanager
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
+def parse_retry_delay(exc):
+    """Return the retry_delay seconds from a ResourceExhausted error, or None"""
+    if not exc.details:
+        return None
+    try:
+        # Attempt to parse the retry_delay from the exception details
+        # The details string format is like: "...retry_delay { seconds: 59 }..."
+        # This is a simple regex to extract the seconds value
+        import re
+        match = re.search(r"retry_delay {\s*seconds: (\d+)\s*}", str(exc.details))
+        if match:
+            return int(match.group(1))
+    except Exception as e:
+        logger.warning(f"Could not parse retry_delay from exception details: {e}")
+    return None
+
+def is_resource_exhausted(exc):
+    """Return True for Gemini quota errors"""
+    # Imported here so google.api_core only loads once Gemini is in use
+    from google.api_core import exceptions
+    return isinstance(exc, exceptions.ResourceExhausted)
+
 # Custom wait strategy for ResourceExhausted errors
 def wait_exponential_from_exception(retry_state):
     exc = retry_state.outcome.exception()
-    if isinstance(exc, exceptions.ResourceExhausted) and exc.details:
-        try:
-            # Attempt to parse the retry_delay from the exception details
-            # The details string format is like: "...retry_delay { seconds: 59 }..."
-            # This is a simple regex to extract the seconds value
-            import re
-            match = re.search(r"retry_delay {\s*seconds: (\d+)\s*}", str(exc.details))
-            if match:
-                delay = int(match.group(1))
-                logger.info(f"ResourceExhausted: Waiting for {delay} seconds before retrying.")
-                return delay
-        except Exception as e:
-            logger.warning(f"Could not parse retry_delay from exception details: {e}. Falling back to exponential wait.")
+    if is_resource_exhausted(exc) and parse_retry_delay(exc):
+        # The shared rate limiter already holds every caller, including this
+        # retry, until the server's retry_delay has passed
+        return 0
     # Fallback to default exponential wait if delay not found or not ResourceExhausted
     return wait_exponential(multiplier=1, min=4, max=60)(retry_state)
 
 # Import configuration
 from config import config
+from classification_cache import ClassificationCache, make_cache_key
+from sender_index import SenderIndex
+from rate_limiter import AdaptiveRateLimiter
+from credential_cache import CredentialCache
+from gmail_client import (
+    build_gmail_service, fetch_message_metadata, get_history_id, get_label_counts, list_history, HistoryExpiredError,
+    iter_message_ids
+)
+from inbox_sync import new_sync_state, state_from_row, state_to_row, apply_history, record_results, summarize
+from job_queue import JobQueue, QueueFullError
+from pipeline import Pipeline, PipelineStats
+from ttl_cache import TTLCache
+from write_behind import WriteBehindBuffer
+from storage import create_storage
+from lazy import LazyValue
+from structured_logging import configure_logging
+from metrics import REGISTRY, Counter, Histogram, CallbackMetric
 
 # Allow insecure transport for OAuth 2 during local development
 # WARNING: Do NOT use this in production!
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))
+# Per-email debug records; only one in LOG_SAMPLE_EVERY of each is kept
+PER_EMAIL_LOG_EVENTS = ('gemini_request', 'gemini_response', 'gemini_invalid_category')
 
-# Configure session for cross-origin requests
-app.config.update(
-    SESSION_COOKIE_SECURE=False,  # Set to True in production with HTTPS
-    SESSION_COOKIE_HTTPONLY=True,
-    SESSION_COOKIE_SAMESITE='Lax',  # Allow cross-origin requests
-    PERMANENT_SESSION_LIFETIME=timedelta(hours=24)
+# Configure logging: a background thread formats and writes every record
+log_handler = configure_logging(
+    level=config['default'].LOG_LEVEL,
+    structured=config['default'].LOG_STRUCTURED,
+    fmt=config['default'].LOG_FORMAT,
+    queue_size=config['default'].LOG_QUEUE_SIZE,
+    sampled_events=PER_EMAIL_LOG_EVENTS,
+    sample_every=config['default'].LOG_SAMPLE_EVERY
 )
+logger = logging.getLogger(__name__)
 
-# Enable CORS for frontend
-CORS(app, origins=['http://localhost:5173', 'http://localhost:5174', 'http://localhost:5175'], supports_credentials=True)
+# Routes are registered on this blueprint and attached to the app by create_app()
+api = Blueprint('api', __name__)
 
 # Configuration from environment variables
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
 SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+STORAGE_BACKEND = config['default'].STORAGE_BACKEND
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
 
-# Validate required environment variables
-if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
-    logger.error("Missing required Google OAuth credentials")
-    raise ValueError("GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET are required")
-
-if not GEMINI_API_KEY:
-    logger.error("Missing required Gemini API key")
-    raise ValueError("GEMINI_API_KEY environment variable is required")
-
-if not SUPABASE_SERVICE_KEY:
-    logger.error("Missing required Supabase Service Key")
-    raise ValueError("SUPABASE_SERVICE_KEY environment variable is required")
+def require_setting(value, name):
+    """Return value, raising ValueError if the environment variable is not set"""
+    if not value:
+        logger.error(f"Missing required setting {name}")
+        raise ValueError(f"{name} environment variable is required")
+    return value
 
-if not SUPABASE_URL:
-    logger.error("Missing required Supabase URL")
-    raise ValueError("SUPABASE_URL environment variable is required")
-
-logger.info("Successfully loaded environment variables")
-import base64
-
-ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY')
-if not ENCRYPTION_KEY:
-    # Generate a new Fernet key if none provided
-    ENCRYPTION_KEY = Fernet.generate_key()
-    logger.warning("No ENCRYPTION_KEY provided, generated a new one")
-else:
+def create_cipher():
+    """Build the Fernet cipher used for stored refresh tokens"""
+    from cryptography.fernet import Fernet
+    encryption_key = os.environ.get('ENCRYPTION_KEY')
+    if not encryption_key:
+        # Generate a new Fernet key if none provided
+        logger.warning("No ENCRYPTION_KEY provided, generated a new one")
+        return Fernet(Fernet.generate_key())
     # Convert string to Fernet-compatible key
     try:
         # Create a consistent key from the provided string
         import hashlib
-        key_bytes = hashlib.sha256(ENCRYPTION_KEY.encode()).digest()
-        ENCRYPTION_KEY = base64.urlsafe_b64encode(key_bytes)
+        key_bytes = hashlib.sha256(encryption_key.encode()).digest()
+        cipher = Fernet(base64.urlsafe_b64encode(key_bytes))
         logger.info("Successfully configured encryption key")
+        return cipher
     except Exception as e:
         logger.error(f"Error setting up encryption key: {e}")
         # Fallback to generating a new key
-        ENCRYPTION_KEY = Fernet.generate_key()
         logger.warning("Fallback to generated encryption key")
+        return Fernet(Fernet.generate_key())
+
+def create_storage_backend():
+    """Connect to the configured storage backend"""
+    if STORAGE_BACKEND == 'supabase':
+        require_setting(SUPABASE_URL, 'SUPABASE_URL')
+        require_setting(SUPABASE_SERVICE_KEY, 'SUPABASE_SERVICE_ROLE_KEY')
+    return create_storage(
+        STORAGE_BACKEND,
+        supabase_url=SUPABASE_URL,
+        supabase_key=SUPABASE_SERVICE_KEY,
+        sqlite_path=config['default'].SQLITE_DB_PATH
+    )
+
+def create_google_transport():
+    """Open the keep-alive pools for Google calls"""
+    from http_transport import GoogleTransport
+    return GoogleTransport(pool_size=config['default'].HTTP_POOL_SIZE, timeout=API_TIMEOUT)
 
-# Initialize services
-genai.configure(api_key=GEMINI_API_KEY) # Use the standard configure method
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-cipher_suite = Fernet(ENCRYPTION_KEY)
+# Clients are built on first use, so importing the app needs no credentials,
+# network or heavy client libraries and each forked worker opens its own
+storage = LazyValue(create_storage_backend, 'storage')
+cipher_suite = LazyValue(create_cipher, 'cipher')
+# Keep-alive connections shared by Gmail, OAuth token refresh and ID token verification
+google_transport = LazyValue(create_google_transport, 'google_transport')
+credential_cache = CredentialCache(max_size=config['default'].CREDENTIAL_CACHE_SIZE)
+
+# Short-lived copies of users rows so usage checks skip the storage round trip
+user_cache = TTLCache(max_size=config['default'].USER_CACHE_SIZE, ttl_seconds=config['default'].USER_CACHE_TTL)
+
+# Get API timeout from config
+API_TIMEOUT = config['default'].API_TIMEOUT
 
 # Email classification categories
 CATEGORIES = [
@@ -124,109 +168,581 @@ CATEGORIES = [
 
 DAILY_FREE_LIMIT = 100
 
-# Get API timeout from config
-API_TIMEOUT = config['default'].API_TIMEOUT
+# Category guide shared by the single and batch prompts
+CATEGORY_GUIDE = """
+        Categories:
+        - Personal: Emails from friends, family, personal contacts
+        - Work: Professional correspondence, project updates, company-wide emails
+        - Bank/Finance: Statements, transaction alerts, financial updates
+        - Promotions/Ads: Marketing emails, newsletters, sales offers
+        - Notifications: System alerts, app notifications (non-social media), reminders
+        - Travel: Flight confirmations, hotel bookings, rental car reservations
+        - Shopping: Order confirmations, shipping updates, receipts from online purchases
+        - Social Media: Notifications from Facebook, Instagram, Twitter, LinkedIn, etc.
+"""
+
+# Number of emails packed into a single Gemini prompt
+CLASSIFY_BATCH_SIZE = config['default'].CLASSIFY_BATCH_SIZE
+
+# Maximum concurrent Gemini batches per chunk of emails
+CLASSIFY_CONCURRENCY = max(1, config['default'].CLASSIFY_CONCURRENCY)
+
+# Message metadata requests grouped into one Gmail batch HTTP call
+GMAIL_BATCH_SIZE = config['default'].GMAIL_BATCH_SIZE
+
+# Most recent INBOX messages whose categories are kept in the sync state
+SYNC_MAX_TRACKED_MESSAGES = config['default'].SYNC_MAX_TRACKED_MESSAGES
+
+# Full scans stop after this many messages; IDs are listed SCAN_PAGE_SIZE at a
+# time and fetched/classified GMAIL_BATCH_SIZE at a time
+MAX_EMAILS_PER_REQUEST = config['default'].MAX_EMAILS_PER_REQUEST
+SCAN_PAGE_SIZE = config['default'].SCAN_PAGE_SIZE
+
+# Threads per pipeline stage and chunks buffered between stages
+PIPELINE_FETCH_WORKERS = max(1, config['default'].PIPELINE_FETCH_WORKERS)
+PIPELINE_CLASSIFY_WORKERS = max(1, config['default'].PIPELINE_CLASSIFY_WORKERS)
+PIPELINE_QUEUE_SIZE = max(1, config['default'].PIPELINE_QUEUE_SIZE)
+
+# Days of history /api/summary returns by default and at most
+SUMMARY_DEFAULT_DAYS = 30
+SUMMARY_MAX_DAYS = 365
+
+# Rows per classified_emails upsert or lookup request
+PERSIST_BATCH_SIZE = max(1, config['default'].PERSIST_BATCH_SIZE)
+
+# Per-stage counters across all classification runs
+pipeline_stats = PipelineStats()
+
+# Seconds between keepalive comments on an idle progress stream
+SSE_KEEPALIVE_SECONDS = 15
+
+# Bump whenever the prompts change so cached categories are not reused
+PROMPT_VERSION = 2
+
+# Latency and outcome of Gemini calls, exported by /metrics
+GEMINI_REQUEST_SECONDS = Histogram(
+    'gemini_request_seconds', 'Gemini generate_content latency, excluding rate limiter waits',
+    labels=('kind', 'outcome')
+)
+GEMINI_RETRIES = Counter('gemini_retries_total', 'Gemini calls retried after ResourceExhausted', labels=('kind',))
+GEMINI_INVALID_CATEGORY = Counter(
+    'gemini_invalid_category_total', 'Single-email Gemini answers outside CATEGORIES, defaulted to Notifications'
+)
+
+def count_gemini_retry(kind):
+    """Return a tenacity before_sleep hook counting retries of kind"""
+    return lambda retry_state: GEMINI_RETRIES.labels(kind).inc()
 
 class EmailClassifier:
-    def __init__(self):
+    def __init__(self, cache=None, rate_limiter=None):
         # Updated to use the current Gemini model
-        self.model = genai.GenerativeModel('gemini-1.5-flash')  # Use gemini-1.5-flash instead of gemini-pro
+        import google.generativeai as genai
+        self.model_name = 'gemini-1.5-flash'  # Use gemini-1.5-flash instead of gemini-pro
+        self.model = genai.GenerativeModel(self.model_name)
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+    
+    def _generate(self, prompt, kind='single', **kwargs):
+        """Send one Gemini request, queued behind the shared rate limiter"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        start = time.perf_counter()
+        try:
+            response = self.model.generate_content(prompt, request_options={'timeout': API_TIMEOUT}, **kwargs)
+        except Exception as e:
+            exhausted = is_resource_exhausted(e)
+            GEMINI_REQUEST_SECONDS.labels(kind, 'resource_exhausted' if exhausted else 'error').observe(
+                time.perf_counter() - start
+            )
+            if self.rate_limiter is not None and exhausted:
+                self.rate_limiter.on_throttle(parse_retry_delay(e))
+            raise
+        GEMINI_REQUEST_SECONDS.labels(kind, 'success').observe(time.perf_counter() - start)
+        if self.rate_limiter is not None:
+            self.rate_limiter.on_success()
+        return response
+    
+    def _cache_key(self, subject, sender, snippet):
+        return make_cache_key(subject, sender, snippet, PROMPT_VERSION, self.model_name)
+    
+    def _cache_get(self, subject, sender, snippet):
+        if self.cache is None:
+            return None
+        return self.cache.get(self._cache_key(subject, sender, snippet))
+    
+    def _cache_set(self, subject, sender, snippet, category):
+        if self.cache is not None:
+            self.cache.set(self._cache_key(subject, sender, snippet), category)
+    
+    def classify_email(self, subject, sender, snippet):
+        """Classify email, answering from the cache when the same content was seen before"""
+        category = self._cache_get(subject, sender, snippet)
+        if category is not None:
+            return category
+        
+        category = self._classify_with_gemini(subject, sender, snippet)
+        if category is None:
+            return "Notifications"
+        
+        self._cache_set(subject, sender, snippet, category)
+        return category
     
     @retry(
         stop=stop_after_attempt(5), # Increased attempts for quota errors
         wait=wait_exponential_from_exception, # Use custom wait strategy
-        retry=retry_if_exception_type(exceptions.ResourceExhausted) # Only retry on ResourceExhausted
+        retry=retry_if_exception(is_resource_exhausted), # Only retry on ResourceExhausted
+        before_sleep=count_gemini_retry('single')
     )
-    def classify_email(self, subject, sender, snippet):
-        """Classify email using Gemini API with retry logic and timeout"""
+    def _classify_with_gemini(self, subject, sender, snippet):
+        """Classify email using Gemini API with retry logic and timeout.
+
+        Returns None when Gemini answers with something outside CATEGORIES.
+        """
         prompt = f"""
         Classify the following email content into one of these categories: {', '.join(CATEGORIES)}.
         
         Email Subject: '{subject}'
         Sender: '{sender}'
         Body Snippet: '{snippet}'
-        
-        Categories:
-        - Personal: Emails from friends, family, personal contacts
-        - Work: Professional correspondence, project updates, company-wide emails
-        - Bank/Finance: Statements, transaction alerts, financial updates
-        - Promotions/Ads: Marketing emails, newsletters, sales offers
-        - Notifications: System alerts, app notifications (non-social media), reminders
-        - Travel: Flight confirmations, hotel bookings, rental car reservations
-        - Shopping: Order confirmations, shipping updates, receipts from online purchases
-        - Social Media: Notifications from Facebook, Instagram, Twitter, LinkedIn, etc.
-        
+        {CATEGORY_GUIDE}
         Respond with only the category name.
         """
         
         # Log the email being classified
-        logger.info(f"Classifying email - Subject: {subject[:50]}, Sender: {sender[:50]}")
+        logger.debug("Classifying email - Subject: %.50s, Sender: %.50s", subject, sender,
+                     extra={'event': 'gemini_request'})
         
-        response = self.model.generate_content(prompt, request_options={'timeout': API_TIMEOUT})
+        response = self._generate(prompt)
         category = response.text.strip()
         
         # Log Gemini's response
-        logger.info(f"Gemini response: '{category}'")
+        logger.debug("Gemini response: %r", category, extra={'event': 'gemini_response'})
         
         # Validate category
         if category in CATEGORIES:
             return category
         else:
             # Log when defaulting
-            logger.warning(f"Invalid category '{category}' from Gemini, defaulting to Notifications")
-            return "Notifications"
+            GEMINI_INVALID_CATEGORY.inc()
+            logger.warning("Invalid category %r from Gemini, defaulting to Notifications", category,
+                           extra={'event': 'gemini_invalid_category'})
+            return None
 
-classifier = EmailClassifier()
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_exponential_from_exception,
+        retry=retry_if_exception(is_resource_exhausted),
+        before_sleep=count_gemini_retry('batch')
+    )
+    def _generate_batch(self, entries):
+        """Ask Gemini to classify several emails at once and return the raw JSON text"""
+        prompt = f"""
+        Classify each of the following emails into one of these categories: {', '.join(CATEGORIES)}.
+        
+        Emails (JSON array, each with a stable "index"):
+        {json.dumps(entries, ensure_ascii=False)}
+        {CATEGORY_GUIDE}
+        Respond with a JSON array containing one object per email, in the form
+        {{"index": <index>, "category": "<category name>"}}.
+        """
+        
+        response = self._generate(
+            prompt,
+            kind='batch',
+            generation_config={'response_mime_type': 'application/json'}
+        )
+        return response.text
+
+    def _parse_batch_response(self, text, expected_indices):
+        """Map index -> category for every valid entry in a batch response"""
+        try:
+            data = json.loads(text)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Could not parse batch response from Gemini: {e}")
+            return {}
+        
+        if isinstance(data, dict):
+            # Tolerate a wrapping object such as {"results": [...]}
+            data = next((v for v in data.values() if isinstance(v, list)), [])
+        if not isinstance(data, list):
+            return {}
+        
+        parsed = {}
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get('index'))
+            except (TypeError, ValueError):
+                continue
+            category = str(item.get('category', '')).strip()
+            if index in expected_indices and category in CATEGORIES:
+                parsed[index] = category
+        return parsed
+
+    def _classify_chunk(self, emails, pending, results):
+        """Classify the emails at the pending indices, writing categories into results.
+
+        Entries missing or invalid in a parsed response are retried; if a
+        Gemini call itself fails (e.g. quota still exhausted after its own
+        retries) the rest of the chunk is left unclassified for a later run.
+        """
+        # First pass for the whole chunk, second pass for entries that came back unusable
+        for attempt in range(2):
+            if len(pending) < 2:
+                break
+            entries = [
+                {
+                    'index': i,
+                    'subject': emails[i].get('subject', ''),
+                    'sender': emails[i].get('sender', ''),
+                    'snippet': emails[i].get('snippet', '')
+                }
+                for i in pending
+            ]
+            try:
+                parsed = self._parse_batch_response(self._generate_batch(entries), set(pending))
+            except Exception as e:
+                # More calls would fail the same way; multiplying them only burns quota
+                logger.error(f"Batch classification failed for {len(pending)} emails, leaving them unclassified: {e}")
+                return
+            for i, category in parsed.items():
+                results[i] = category
+                self._cache_set(emails[i].get('subject', ''), emails[i].get('sender', ''), emails[i].get('snippet', ''), category)
+            pending = [i for i in pending if results[i] is None]
+            logger.debug("Batch pass %d: classified %d emails, %d pending", attempt + 1, len(parsed), len(pending))
+        
+        # Fall back to one call per email for whatever is left
+        for position, i in enumerate(pending):
+            email = emails[i]
+            try:
+                results[i] = self.classify_email(
+                    email.get('subject', ''), email.get('sender', ''), email.get('snippet', '')
+                )
+            except Exception as e:
+                # Leave this and the remaining entries as None so the caller can skip them
+                logger.error(f"Error classifying email at index {i}, leaving {len(pending) - position} unclassified: {e}")
+                return
+
+    def classify_batch(self, emails, max_workers=1, on_chunk=None):
+        """Classify a list of emails with one Gemini call per CLASSIFY_BATCH_SIZE emails.
+
+        Each email is a dict with 'subject', 'sender' and 'snippet'. Returns a list of
+        categories in the same order. Entries missing or invalid in the batch response
+        are retried once as a smaller batch, then individually via classify_email;
+        entries are left None when a Gemini call raises. Up to max_workers batches
+        are sent to Gemini concurrently. on_chunk(indices, categories) is called,
+        possibly from worker threads, as each group of emails is classified.
+        """
+        results = [None] * len(emails)
+        
+        # Answer what we can from the cache before building any prompt, and send
+        # identical emails within the run to Gemini only once
+        uncached = []
+        duplicates = {}  # index of the email sent to Gemini -> indices sharing its content
+        first_seen = {}
+        for i, email in enumerate(emails):
+            subject, sender, snippet = email.get('subject', ''), email.get('sender', ''), email.get('snippet', '')
+            results[i] = self._cache_get(subject, sender, snippet)
+            if results[i] is not None:
+                continue
+            key = self._cache_key(subject, sender, snippet)
+            if key in first_seen:
+                duplicates[first_seen[key]].append(i)
+            else:
+                first_seen[key] = i
+                duplicates[i] = []
+                uncached.append(i)
+        if len(uncached) < len(emails):
+            logger.debug("Classification cache answered %d of %d emails", len(emails) - len(uncached), len(emails))
+            cached = [i for i, category in enumerate(results) if category is not None]
+            if on_chunk is not None and cached:
+                on_chunk(cached, [results[i] for i in cached])
+        
+        def run_chunk(chunk):
+            self._classify_chunk(emails, chunk, results)
+            # Duplicates share the answer of the email that was sent
+            done = []
+            for i in chunk:
+                done.append(i)
+                for j in duplicates[i]:
+                    results[j] = results[i]
+                    done.append(j)
+            if on_chunk is not None:
+                on_chunk(done, [results[i] for i in done])
+        
+        # Chunks write to disjoint indices of results, so they can run in parallel
+        chunks = [uncached[start:start + CLASSIFY_BATCH_SIZE] for start in range(0, len(uncached), CLASSIFY_BATCH_SIZE)]
+        if max_workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+                list(executor.map(run_chunk, chunks))
+        else:
+            for chunk in chunks:
+                run_chunk(chunk)
+        
+        return results
+
+def create_classification_cache():
+    """Open the classification cache and its optional SQLite tier"""
+    return ClassificationCache(
+        max_size=config['default'].CLASSIFICATION_CACHE_SIZE,
+        ttl_seconds=config['default'].CLASSIFICATION_CACHE_TTL,
+        db_path=config['default'].CLASSIFICATION_CACHE_DB or None,
+        db_max_rows=config['default'].CLASSIFICATION_CACHE_DB_MAX_ROWS
+    )
+
+classification_cache = LazyValue(create_classification_cache, 'classification_cache')
+# Shared by every request and worker thread so quota errors slow everyone down
+gemini_rate_limiter = AdaptiveRateLimiter(
+    initial_rpm=config['default'].GEMINI_RATE_INITIAL_RPM,
+    min_rpm=config['default'].GEMINI_RATE_MIN_RPM,
+    max_rpm=config['default'].GEMINI_RATE_MAX_RPM,
+    burst=config['default'].GEMINI_RATE_BURST
+)
+
+def create_classifier():
+    """Configure Gemini and build the shared classifier"""
+    import google.generativeai as genai
+    genai.configure(api_key=require_setting(GEMINI_API_KEY, 'GEMINI_API_KEY'))
+    return EmailClassifier(cache=classification_cache.get(), rate_limiter=gemini_rate_limiter)
+
+classifier = LazyValue(create_classifier, 'classifier')
+
+# Routes high-volume senders with a stable history around Gemini
+sender_index = SenderIndex(
+    CATEGORIES,
+    min_count=config['default'].SENDER_INDEX_MIN_COUNT,
+    min_confidence=config['default'].SENDER_INDEX_MIN_CONFIDENCE
+)
+sender_index_lock = threading.Lock()
+
+# Optional local first-pass model, trained offline with train_local_classifier.py
+LOCAL_MODEL_PATH = config['default'].LOCAL_MODEL_PATH
+LOCAL_MODEL_THRESHOLD = config['default'].LOCAL_MODEL_THRESHOLD
+
+def load_local_model():
+    """Load the local classifier, or return None if none is configured or it fails to load"""
+    if not LOCAL_MODEL_PATH or not os.path.exists(LOCAL_MODEL_PATH):
+        return None
+    try:
+        from local_classifier import LocalClassifier
+        return LocalClassifier.load(LOCAL_MODEL_PATH)
+    except Exception as e:
+        logger.error(f"Error loading local classifier from {LOCAL_MODEL_PATH}: {e}")
+        return None
+
+local_model = LazyValue(load_local_model, 'local_model')
+
+# Reported by /health; none are built until a request needs them
+LAZY_SERVICES = [storage, cipher_suite, google_transport, classification_cache, classifier, local_model]
 
 def encrypt_token(token):
     """Encrypt OAuth token for secure storage"""
-    return cipher_suite.encrypt(token.encode()).decode()
+    return cipher_suite.get().encrypt(token.encode()).decode()
 
 def decrypt_token(encrypted_token):
     """Decrypt OAuth token"""
-    return cipher_suite.decrypt(encrypted_token.encode()).decode()
+    return cipher_suite.get().decrypt(encrypted_token.encode()).decode()
+
+def build_user_credentials(refresh_token):
+    """Create credentials that will get their access token on refresh"""
+    from google.oauth2.credentials import Credentials
+    return Credentials(
+        token=None,  # We'll refresh to get a new access token
+        refresh_token=refresh_token,
+        token_uri="https://oauth2.googleapis.com/token",
+        client_id=require_setting(GOOGLE_CLIENT_ID, 'GOOGLE_CLIENT_ID'),
+        client_secret=require_setting(GOOGLE_CLIENT_SECRET, 'GOOGLE_CLIENT_SECRET')
+    )
+
+OAUTH_REFRESH_SECONDS = Histogram('oauth_refresh_seconds', 'OAuth access token refresh latency', labels=('outcome',))
+
+def refresh_credentials(credentials):
+    """Refresh credentials to get a new access token"""
+    logger.info("Refreshing credentials...")
+    start = time.perf_counter()
+    try:
+        credentials.refresh(google_transport.get().auth_request)
+    except Exception:
+        OAUTH_REFRESH_SECONDS.labels('error').observe(time.perf_counter() - start)
+        raise
+    OAUTH_REFRESH_SECONDS.labels('success').observe(time.perf_counter() - start)
+    logger.info("Successfully refreshed credentials")
+
+def get_user_credentials(user_id, refresh_token):
+    """Get valid credentials for a user, refreshing only when the cached token has expired"""
+    return credential_cache.get(user_id, refresh_token, build_user_credentials, refresh_credentials)
 
 def get_user_data(user_id):
-    """Get user data from Supabase"""
+    """Get user data from storage, served from user_cache while fresh"""
+    cached = user_cache.get(user_id)
+    if not user_cache.is_miss(cached):
+        return cached
+    # A reservation or refund that lands during the read makes it stale
+    generation = user_cache.generation()
     try:
-        result = supabase.table('users').select('*').eq('user_id', user_id).execute()
-        if result.data:
-            return result.data[0]
-        return None
+        user_data = storage.get().get_user(user_id)
+        user_cache.set(user_id, user_data, generation)
+        return user_data
     except Exception as e:
         logger.error(f"Error getting user data: {e}")
         return None
 
-def update_user_usage(user_id, processed_count):
-    """Update user's daily usage count"""
+def reserve_daily_quota(user_id, requested):
+    """Atomically reserve up to requested emails of today's quota in one round trip.
+
+    Returns (reserved, remaining). The storage locks the user's row, resets
+    the count on a new day and never grants past the daily limit, so
+    concurrent runs cannot overshoot it.
+    """
+    today = datetime.now().date().isoformat()
+    reserved, remaining = storage.get().reserve_quota(user_id, requested, DAILY_FREE_LIMIT, today)
+    user_cache.invalidate(user_id)
+    return reserved, remaining
+
+def refund_daily_quota(user_id, amount, day):
+    """Return quota reserved on day but not used; raises on failure"""
+    if amount <= 0:
+        return
+    storage.get().refund_quota(user_id, amount, day)
+    user_cache.invalidate(user_id)
+
+def get_sync_state(user_id):
+    """Get the user's inbox sync state from storage"""
     try:
-        today = datetime.now().date().isoformat()
-        user_data = get_user_data(user_id)
-        
-        if user_data:
-            # Check if it's a new day
-            if user_data.get('last_processed_date') != today:
-                # Reset count for new day
-                supabase.table('users').update({
-                    'daily_processed_count': processed_count,
-                    'last_processed_date': today
-                }).eq('user_id', user_id).execute()
-            else:
-                # Update existing count
-                new_count = user_data.get('daily_processed_count', 0) + processed_count
-                supabase.table('users').update({
-                    'daily_processed_count': new_count
-                }).eq('user_id', user_id).execute()
-        else:
-            # Create new user record
-            supabase.table('users').insert({
-                'user_id': user_id,
-                'daily_processed_count': processed_count,
-                'last_processed_date': today
-            }).execute()
-            
+        row = storage.get().get_sync_state(user_id)
+        if row:
+            return state_from_row(row)
+        return None
+    except Exception as e:
+        logger.error(f"Error getting sync state: {e}")
+        return None
+
+def save_sync_state(user_id, state):
+    """Store the user's inbox sync state"""
+    try:
+        storage.get().save_sync_state(state_to_row(user_id, state))
+    except Exception as e:
+        logger.error(f"Error saving sync state: {e}")
+
+def get_classified_categories(user_id, message_ids):
+    """Return {gmail message id: category} for the messages already classified, stored or still buffered"""
+    categories = {}
+    try:
+        for i in range(0, len(message_ids), PERSIST_BATCH_SIZE):
+            categories.update(storage.get().get_classified_categories(user_id, message_ids[i:i + PERSIST_BATCH_SIZE]))
     except Exception as e:
-        logger.error(f"Error updating user usage: {e}")
+        # Classify everything rather than fail the run
+        logger.error(f"Error reading classified emails: {e}")
+        categories = {}
+    # Results not written yet are as good as stored, and newer
+    buffered = persistence_buffer.pending((user_id, message_id) for message_id in message_ids)
+    for (_, message_id), row in buffered.items():
+        categories[message_id] = row['category']
+    return categories
+
+def classified_email_row(user_id, email, category, source):
+    """Build a classified_emails row for one result; source names the stage that answered"""
+    return {
+        'user_id': user_id,
+        'email_id_from_gmail': email['id'],
+        'category': category,
+        'subject': email.get('subject'),
+        'sender': email.get('sender'),
+        'snippet': email.get('snippet'),
+        'source': source,
+        'classified_at': datetime.now().isoformat()
+    }
+
+def save_classified_emails(rows):
+    """Bulk upsert classified_emails rows, PERSIST_BATCH_SIZE per request; raises on failure"""
+    for i in range(0, len(rows), PERSIST_BATCH_SIZE):
+        storage.get().upsert_classified_emails(rows[i:i + PERSIST_BATCH_SIZE])
+
+# Result rows are written behind the run on one background thread
+persistence_buffer = WriteBehindBuffer(
+    flush_rows=save_classified_emails,
+    batch_size=PERSIST_BATCH_SIZE,
+    flush_interval=config['default'].WRITE_BEHIND_FLUSH_INTERVAL,
+    max_rows=config['default'].WRITE_BEHIND_MAX_ROWS,
+    key=lambda row: (row['user_id'], row['email_id_from_gmail']),
+    max_attempts=config['default'].WRITE_BEHIND_MAX_ATTEMPTS,
+    add_timeout=config['default'].WRITE_BEHIND_ADD_TIMEOUT
+)
+atexit.register(persistence_buffer.close)
+
+def get_daily_summary(user_id, since):
+    """Return classification_daily_summary rows for a user from the date since onwards"""
+    return storage.get().get_daily_summary(user_id, since)
+
+def ensure_sender_index_loaded():
+    """Build the sender index from classified_emails on first use"""
+    if sender_index.loaded:
+        return
+    with sender_index_lock:
+        if sender_index.loaded:
+            return
+        try:
+            # Only Gemini answers, so routed answers never feed back into the index
+            sender_index.load(storage.get().list_sender_categories())
+        except Exception as e:
+            # Route nothing rather than fail the request; retry on the next one
+            logger.error(f"Error loading sender index: {e}")
+
+def classify_with_routing(emails, on_classified=None):
+    """Classify emails, answering confident senders from the sender index and
+    confident predictions from the local model before falling back to Gemini.
+
+    Returns (categories, sources, llm_skipped) where categories and sources
+    ('sender_index', 'local_model' or 'gemini') are aligned with emails.
+    on_classified(indices, categories) is called as each group is answered.
+    """
+    ensure_sender_index_loaded()
+    
+    def report(indices):
+        if on_classified is not None and indices:
+            on_classified(indices, [categories[i] for i in indices])
+    
+    categories = [sender_index.lookup(email.get('sender', '')) for email in emails]
+    sources = ['sender_index' if category is not None else None for category in categories]
+    remaining = [i for i, category in enumerate(categories) if category is None]
+    if len(remaining) < len(emails):
+        logger.debug("Sender index answered %d of %d emails", len(emails) - len(remaining), len(emails))
+        report([i for i, category in enumerate(categories) if category is not None])
+    
+    model = local_model.get()
+    if remaining and model is not None:
+        try:
+            predictions = model.predict([emails[i] for i in remaining], LOCAL_MODEL_THRESHOLD)
+            for i, category in zip(remaining, predictions):
+                categories[i] = category
+                if category is not None:
+                    sources[i] = 'local_model'
+            answered = sum(1 for category in predictions if category is not None)
+            logger.debug("Local classifier answered %d of %d emails", answered, len(remaining))
+            report([i for i in remaining if categories[i] is not None])
+            remaining = [i for i in remaining if categories[i] is None]
+        except Exception as e:
+            logger.error(f"Local classifier failed, sending all remaining emails to Gemini: {e}")
+    
+    llm_skipped = len(emails) - len(remaining)
+    
+    if remaining:
+        def on_chunk(indices, results):
+            if on_classified is not None:
+                on_classified([remaining[i] for i in indices], results)
+        
+        results = classifier.get().classify_batch(
+            [emails[i] for i in remaining], max_workers=CLASSIFY_CONCURRENCY, on_chunk=on_chunk
+        )
+        for i, category in zip(remaining, results):
+            categories[i] = category
+            # Only model answers feed the index, so it never reinforces itself
+            if category is not None:
+                sources[i] = 'gemini'
+                sender_index.update(emails[i].get('sender', ''), category)
+    
+    return categories, sources, llm_skipped
 
 def check_daily_limit(user_id):
     """Check if user has exceeded daily limit"""
@@ -247,28 +763,34 @@ def check_daily_limit(user_id):
         logger.error(f"Error checking daily limit: {e}")
         return False
 
-@app.route('/auth/google')
+def build_oauth_flow():
+    """Create the Google OAuth flow for the current request"""
+    from google_auth_oauthlib.flow import Flow
+    flow = Flow.from_client_config(
+        {
+            "web": {
+                "client_id": require_setting(GOOGLE_CLIENT_ID, 'GOOGLE_CLIENT_ID'),
+                "client_secret": require_setting(GOOGLE_CLIENT_SECRET, 'GOOGLE_CLIENT_SECRET'),
+                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                "token_uri": "https://oauth2.googleapis.com/token",
+                "redirect_uris": ["http://localhost:5000/auth/callback"]
+            }
+        },
+        scopes=[
+            'https://www.googleapis.com/auth/userinfo.profile',
+            'https://www.googleapis.com/auth/gmail.readonly',
+            'openid',
+            'https://www.googleapis.com/auth/userinfo.email'
+        ]
+    )
+    flow.redirect_uri = url_for('api.auth_callback', _external=True)
+    return flow
+
+@api.route('/auth/google')
 def google_auth():
     """Initiate Google OAuth flow"""
     try:
-        flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": GOOGLE_CLIENT_ID,
-                    "client_secret": GOOGLE_CLIENT_SECRET,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uris": ["http://localhost:5000/auth/callback"]
-                }
-            },
-            scopes=[
-                'https://www.googleapis.com/auth/userinfo.profile',
-                'https://www.googleapis.com/auth/gmail.readonly',
-                'openid',
-                'https://www.googleapis.com/auth/userinfo.email'
-            ]
-        )
-        flow.redirect_uri = url_for('auth_callback', _external=True)
+        flow = build_oauth_flow()
         
         authorization_url, state = flow.authorization_url(
             access_type='offline',
@@ -283,11 +805,11 @@ def google_auth():
         logger.error(f"Error initiating Google auth: {e}")
         return jsonify({'error': 'Failed to initiate authentication'}), 500
 
-@app.route('/')
+@api.route('/')
 def index():
     return("Welcome To Backend")
 
-@app.route('/auth/callback')
+@api.route('/auth/callback')
 def auth_callback():
     """Handle Google OAuth callback"""
     try:
@@ -310,30 +832,14 @@ def auth_callback():
             return redirect('http://localhost:5173/auth/callback?error=state_mismatch')
         
         # Create OAuth flow
-        flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": GOOGLE_CLIENT_ID,
-                    "client_secret": GOOGLE_CLIENT_SECRET,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uris": ["http://localhost:5000/auth/callback"]
-                }
-            },
-            scopes=[
-                'https://www.googleapis.com/auth/userinfo.profile',
-                'https://www.googleapis.com/auth/gmail.readonly',
-                'openid',
-                'https://www.googleapis.com/auth/userinfo.email'
-            ]
-        )
-        flow.redirect_uri = url_for('auth_callback', _external=True)
+        flow = build_oauth_flow()
         
         # Get authorization code and exchange for token
         authorization_response = request.url
         logger.info(f"Authorization response URL: {authorization_response}")
         
-        token_response = flow.fetch_token(authorization_response=authorization_response)
+        google_transport.get().mount(flow.oauth2session)
+        token_response = flow.fetch_token(authorization_response=authorization_response, timeout=API_TIMEOUT)
         credentials = flow.credentials
         
         logger.info("Successfully obtained credentials from Google")
@@ -341,7 +847,6 @@ def auth_callback():
         
         # Build the OAuth2 service to get user info
         from google.oauth2 import id_token
-        from google.auth.transport import requests as google_requests
         
         user_email = "authenticated_user@example.com"  # Default fallback
         user_id = "google_authenticated_user"  # Default fallback
@@ -352,7 +857,7 @@ def auth_callback():
             if id_token_str:
                 idinfo = id_token.verify_oauth2_token(
                     id_token_str, 
-                    google_requests.Request(), 
+                    google_transport.get().auth_request, 
                     GOOGLE_CLIENT_ID
                 )
                 
@@ -384,7 +889,17 @@ def auth_callback():
         logger.info(f"Session after auth: user_id={session.get('user_id')}, email={session.get('user_email')}")
         
         # Redirect to frontend OAuth callback route
-        return redirect('http://localhost:5173/auth/callback?success=true')
+        response = redirect('http://localhost:5173/auth/callback?success=true')
+        # The session cookie is re-signed on every response, so a load balancer
+        # keeping each user's jobs on one instance needs a value that stays put
+        response.set_cookie(
+            config['default'].AFFINITY_COOKIE_NAME,
+            hashlib.sha256(str(user_id).encode()).hexdigest()[:16],
+            max_age=int(config['default'].PERMANENT_SESSION_LIFETIME.total_seconds()),
+            httponly=True,
+            samesite='Lax'
+        )
+        return response
         
     except Exception as e:
         logger.error(f"Error in auth callback: {e}")
@@ -395,7 +910,7 @@ def auth_callback():
         logger.error(f"Full traceback: {traceback.format_exc()}")
         return redirect('http://localhost:5173/auth/callback?error=auth_failed')
 
-@app.route('/api/user/status')
+@api.route('/api/user/status')
 def user_status():
     """Get current user authentication status"""
     try:
@@ -408,14 +923,310 @@ def user_status():
         logger.error(f"Error checking user status: {e}")
         return jsonify({'authenticated': False})
 
-@app.route('/api/emails/classify', methods=['POST'])
+def run_classification(user_id, refresh_token, on_progress=None, cancel_event=None):
+    """Fetch and classify a user's new INBOX messages and return the run summary.
+
+    on_progress(event), if given, receives running category counts, the
+    processed count and the INBOX unread count as each group of emails is
+    classified. It may be called from worker threads. Setting cancel_event
+    stops the run before its next chunk; work done so far is still saved.
+    """
+    # Reuse the user's access token while it is still valid
+    try:
+        credentials = get_user_credentials(user_id, refresh_token)
+    except Exception as e:
+        logger.error(f"Error refreshing credentials: {e}")
+        raise # Re-raise to be handled by the caller
+    
+    # Build Gmail service from the cached discovery document
+    service = build_gmail_service(credentials)
+    logger.debug("Gmail service built successfully")
+    
+    # Every Gmail call checks a keep-alive connection out of the shared pool
+    import google_auth_httplib2
+    @contextmanager
+    def gmail_http():
+        with google_transport.get().gmail_pool.connection() as http:
+            yield google_auth_httplib2.AuthorizedHttp(credentials, http=http)
+
+    # Work out which messages need classifying: only changes since the last
+    # run when the stored history is still available, otherwise a full scan
+    state = get_sync_state(user_id)
+    sync_mode = 'full'
+    if state:
+        try:
+            records, latest_history_id = list_history(service, state['history_id'], http_factory=gmail_http)
+            new_ids = apply_history(state, records)
+            state['history_id'] = str(latest_history_id)
+            sync_mode = 'incremental'
+            logger.debug("Incremental sync: %d history records, %d new messages", len(records), len(new_ids))
+            # History is oldest first; classify the newest first
+            history_ids = iter(reversed(new_ids))
+        except HistoryExpiredError as e:
+            logger.info(f"{e}, falling back to a full scan")
+            state = None
+    
+    if state is None:
+        # Read the history cursor before listing so no change is missed
+        state = new_sync_state(get_history_id(service, http_factory=gmail_http))
+        state['scan'] = {'page_token': None, 'budget': MAX_EMAILS_PER_REQUEST}
+        history_ids = iter(())
+    
+    # A full scan carries on across runs after the new messages; pages are
+    # only requested as the chunks below consume them, and the cursor
+    # records where listing stopped so nothing is listed twice
+    source = history_ids
+    scan_cursor = dict(state['scan'] or {})
+    if state['scan']:
+        source = chain(history_ids, iter_message_ids(
+            service, budget=scan_cursor['budget'], page_size=SCAN_PAGE_SIZE, http_factory=gmail_http,
+            page_token=scan_cursor['page_token'], cursor=scan_cursor
+        ))
+    
+    # Inbox-wide totals come from the label itself rather than from counting
+    # UNREAD on each message; fall back to the tracked messages if it fails
+    try:
+        inbox_total, inbox_unread = get_label_counts(service, 'INBOX', http_factory=gmail_http)
+    except Exception as e:
+        logger.error(f"Error reading INBOX label counts: {e}")
+        inbox_total, inbox_unread = None, None
+    
+    # Stream message IDs through fetch and classify a chunk at a time so
+    # memory stays bounded however large the mailbox or budget is
+    processed_count = 0
+    llm_skipped = 0
+    already_classified = 0
+    chunks = 0
+    run_started = time.monotonic()
+    
+    # Running totals for progress events, starting from the already tracked messages
+    progress_lock = threading.Lock()
+    progress = {'total_processed': 0}
+    progress['categories'], tracked_unread = summarize(state, CATEGORIES)
+    progress_unread = inbox_unread if inbox_unread is not None else tracked_unread
+    
+    def report_progress(categories, new=True):
+        with progress_lock:
+            for category in categories:
+                if category is None:
+                    continue
+                progress['categories'][category] += 1
+                if new:
+                    progress['total_processed'] += 1
+            event = {
+                'categories': dict(progress['categories']),
+                'total_processed': progress['total_processed'],
+                'unread_count': progress_unread
+            }
+        on_progress(event)
+    
+    # Quota is reserved a chunk at a time for the emails that still need a
+    # category, so a run only holds what it is about to use and concurrent
+    # runs cannot both spend it; whatever is not used is refunded below
+    quota_day = datetime.now().date().isoformat()
+    quota_lock = threading.Lock()
+    quota = {'reserved': 0, 'remaining': None, 'exhausted': False}
+    
+    def reserve_quota(count):
+        try:
+            granted, remaining = reserve_daily_quota(user_id, count)
+        except Exception as e:
+            logger.error(f"Error reserving daily quota: {e}")
+            raise
+        with quota_lock:
+            quota['reserved'] += granted
+            quota['remaining'] = remaining
+            if granted < count:
+                quota['exhausted'] = True
+        return granted
+    
+    # Each chunk is one Gmail batch request
+    def list_chunks():
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info(f"Classification cancelled for user {user_id}")
+                return
+            if quota['exhausted']:
+                # Over the limit: what is left is saved as pending below
+                return
+            chunk = list(islice(source, GMAIL_BATCH_SIZE))
+            if not chunk:
+                return
+            yield chunk
+    
+    def fetch_chunk(chunk):
+        fetched = fetch_message_metadata(service, chunk, http_factory=gmail_http, batch_size=GMAIL_BATCH_SIZE)
+        emails = [fetched[message_id] for message_id in chunk if message_id in fetched]
+        logger.debug("Fetched metadata for %d of %d messages", len(emails), len(chunk))
+        return chunk, emails
+    
+    def classify_chunk(item):
+        chunk, emails = item
+        # Messages classified on an earlier run keep their stored category
+        known = get_classified_categories(user_id, [email['id'] for email in emails]) if emails else {}
+        known_emails = [email for email in emails if email['id'] in known]
+        known_categories = [known[email['id']] for email in known_emails]
+        emails = [email for email in emails if email['id'] not in known]
+        if known_emails:
+            logger.debug("Skipping %d already classified emails", len(known_emails))
+            if on_progress is not None:
+                report_progress(known_categories, new=False)
+        
+        # Only emails that need a category count against the daily limit;
+        # those over it are left unclassified for a later run
+        if emails:
+            emails = emails[:reserve_quota(len(emails))]
+        
+        # Classify in batches instead of one Gemini call per email
+        logger.debug("Starting classification of %d emails", len(emails))
+        def report_classified(indices, results):
+            report_progress(results)
+        on_classified = report_classified if on_progress is not None else None
+        categories, sources, skipped = classify_with_routing(emails, on_classified) if emails else ([], [], 0)
+        return chunk, emails, categories, sources, skipped, known_emails, known_categories
+    
+    # Gmail fetches and classification overlap: later chunks are fetched
+    # while earlier ones wait on Gemini, and bounded queues between the
+    # stages stop listing from running ahead of the slowest stage
+    pipeline = Pipeline(
+        list_chunks(),
+        [
+            ('fetch', fetch_chunk, PIPELINE_FETCH_WORKERS),
+            ('classify', classify_chunk, PIPELINE_CLASSIFY_WORKERS)
+        ],
+        queue_size=PIPELINE_QUEUE_SIZE,
+        stats=pipeline_stats,
+        source_name='list'
+    )
+    
+    # Aggregate on this thread so the sync state is only touched here
+    unresolved = []  # Listed this run but not fetched or classified
+    try:
+        for chunk, emails, categories, sources, skipped, known_emails, known_categories in pipeline:
+            chunks += 1
+            resolved = {email['id'] for email, category in zip(emails, categories) if category is not None}
+            resolved.update(email['id'] for email in known_emails)
+            unresolved.extend(message_id for message_id in chunk if message_id not in resolved)
+            processed_count += sum(1 for category in categories if category is not None)
+            llm_skipped += skipped
+            already_classified += len(known_emails)
+            record_results(state, emails + known_emails, categories + known_categories, SYNC_MAX_TRACKED_MESSAGES)
+            
+            # Persisted in bulk by the write-behind buffer
+            persistence_buffer.add_rows(
+                classified_email_row(user_id, email, category, source)
+                for email, category, source in zip(emails, categories, sources) if category is not None
+            )
+    finally:
+        # Usage is only charged for emails actually classified; the refund is
+        # written now so the quota is free again as soon as the run ends
+        unused = quota['reserved'] - processed_count
+        try:
+            refund_daily_quota(user_id, unused, quota_day)
+        except Exception as e:
+            logger.error(f"Error refunding {unused} unused emails of daily quota: {e}")
+            unused = 0
+    
+    if quota['remaining'] is None:
+        # Nothing was listed, so nothing was reserved; read the remaining quota
+        quota['remaining'] = reserve_daily_quota(user_id, 0)[1]
+    daily_remaining = quota['remaining'] + unused
+    
+    # Messages whose fetch or classification failed, and messages over the
+    # limit, wait for the next run: the history cursor has already moved
+    # past them, so pending is the only record that they still need work.
+    # Only IDs already in memory are kept; the scan resumes from its cursor
+    remaining = unresolved + list(history_ids)
+    if 'unyielded' in scan_cursor:
+        # The scan read a page this run: the rest of it joins pending
+        remaining.extend(scan_cursor['unyielded'])
+        page_token = scan_cursor['page_token']
+        state['scan'] = {'page_token': page_token, 'budget': scan_cursor['budget']} if page_token else None
+    state['pending'] = list(reversed(remaining))
+    
+    # Counts cover every tracked INBOX message, not just this run's
+    category_counts, unread_count = summarize(state, CATEGORIES)
+    if inbox_unread is not None:
+        unread_count = inbox_unread
+    
+    # One record per run instead of per-email lines
+    logger.info("Classification complete. Processed %d emails", processed_count, extra={
+        'event': 'classification_run',
+        'user_id': user_id,
+        'sync_mode': sync_mode,
+        'reserved': quota['reserved'],
+        'processed': processed_count,
+        'already_classified': already_classified,
+        'llm_skipped': llm_skipped,
+        'chunks': chunks,
+        'duration_seconds': round(time.monotonic() - run_started, 3)
+    })
+    
+    save_sync_state(user_id, state)
+    
+    return {
+        'categories': category_counts,
+        'total_processed': processed_count,
+        'unread_count': unread_count,
+        'inbox_total': inbox_total,
+        'llm_skipped': llm_skipped,
+        'already_classified': already_classified,
+        'total_tracked': len(state['messages']),
+        'sync_mode': sync_mode,
+        'daily_limit': DAILY_FREE_LIMIT,
+        'daily_remaining': daily_remaining
+    }
+
+# Whole runs take from seconds to minutes
+CLASSIFY_RUN_SECONDS = Histogram(
+    'classify_run_seconds', 'End-to-end classification job duration', labels=('outcome',),
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+)
+CLASSIFY_EMAILS = Counter(
+    'classify_emails_total', 'Emails handled by classification runs by result', labels=('result',)
+)
+
+def run_classification_job(job, refresh_token):
+    """Job queue runner: classify for the job's user, publishing progress on the job"""
+    start = time.perf_counter()
+    try:
+        result = run_classification(
+            job.user_id,
+            refresh_token,
+            on_progress=lambda event: classification_jobs.update_progress(job, event),
+            cancel_event=job.cancel_event
+        )
+    except Exception:
+        CLASSIFY_RUN_SECONDS.labels('failed').observe(time.perf_counter() - start)
+        raise
+    outcome = 'cancelled' if job.cancel_event.is_set() else 'succeeded'
+    CLASSIFY_RUN_SECONDS.labels(outcome).observe(time.perf_counter() - start)
+    CLASSIFY_EMAILS.labels('classified').inc(result['total_processed'])
+    CLASSIFY_EMAILS.labels('already_classified').inc(result['already_classified'])
+    CLASSIFY_EMAILS.labels('llm_skipped').inc(result['llm_skipped'])
+    return result
+
+# Classification runs in the background; requests only enqueue and poll
+classification_jobs = JobQueue(
+    run_classification_job,
+    workers=max(1, config['default'].JOB_WORKERS),
+    max_queued=config['default'].JOB_MAX_QUEUED,
+    retention_seconds=config['default'].JOB_RETENTION_SECONDS
+)
+
+def get_user_job(job_id):
+    """Return the job if it belongs to the session's user, else None"""
+    job = classification_jobs.get(job_id)
+    if job is None or job.user_id != session.get('user_id'):
+        return None
+    return job
+
+@api.route('/api/emails/classify', methods=['POST'])
 def classify_emails():
-    """Fetch and classify user's Gmail emails"""
+    """Queue a classification job for the user's Gmail emails and return its ID"""
     try:
-        logger.info(f"Classify emails request received")
-        logger.info(f"Session keys: {list(session.keys())}")
-        logger.info(f"User ID in session: {session.get('user_id', 'NOT SET')}")
-        logger.info(f"Refresh token in session: {'refresh_token' in session}")
+        logger.debug("Classify emails request: user_id=%s, refresh token in session: %s",
+                     session.get('user_id', 'NOT SET'), 'refresh_token' in session)
         
         if 'user_id' not in session or 'refresh_token' not in session:
             logger.error("Authentication check failed - missing session data")
@@ -437,138 +1248,20 @@ def classify_emails():
         refresh_token = decrypt_token(session['refresh_token'])
         logger.info("Successfully decrypted refresh token")
         
-        # Create credentials from stored tokens
-        refresh_token = decrypt_token(session['refresh_token'])
-        logger.info("Successfully decrypted refresh token")
-        
-        credentials = Credentials(
-            token=None,  # We'll refresh to get a new access token
-            refresh_token=refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=GOOGLE_CLIENT_ID,
-            client_secret=GOOGLE_CLIENT_SECRET
-        )
-        
-        # Refresh token to get access token
-        logger.info("Refreshing credentials...")
-        try:
-            credentials.refresh(Request())
-            logger.info("Successfully refreshed credentials")
-        except Exception as e:
-            logger.error(f"Error refreshing credentials: {e}")
-            raise # Re-raise to be caught by outer try-except
-        
-        # Build Gmail service with a custom http object for timeout
-        logger.info("Building Gmail service...")
-        # Import httplib2 and create a http object with timeout
-        service = build('gmail', 'v1', credentials=credentials)
-        logger.info("Gmail service built successfully")
-        
-        @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(Exception))
-        def fetch_messages_with_retry():
-            logger.info("Fetching emails from Gmail with retry...")
-            return service.users().messages().list(
-                userId='me',
-                maxResults=100,
-                labelIds=['INBOX']
-            ).execute()
-
-        @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(Exception))
-        def get_message_with_retry(message_id):
-            logger.info(f"Getting message {message_id} with retry...")
-            return service.users().messages().get(
-                userId='me',
-                id=message_id,
-                format='metadata',
-                metadataHeaders=['Subject', 'From']
-            ).execute()
-
-        # Fetch last 100 emails
-        results = fetch_messages_with_retry()
-        
-        messages = results.get('messages', [])
-        logger.info(f"Found {len(messages)} messages")
-        
-        if not messages:
-            logger.info("No messages found")
-            return jsonify({
-                'categories': {category: 0 for category in CATEGORIES},
-                'total_processed': 0,
-                'unread_count': 0
-            })
-
-        # Initialize category counts
-        category_counts = {category: 0 for category in CATEGORIES}
-        unread_count = 0
-        processed_count = 0
-        
-        # Process each email
-        logger.info("Starting email classification...")
-        # Log first 5 emails for debugging
-        sample_emails = []
+        # A user with a job already queued or running gets that job back
+        job, created = classification_jobs.submit(user_id, refresh_token)
         
-        for i, message in enumerate(messages):
-            try:
-                logger.info(f"Processing message {i+1}/{len(messages)}")
-                
-                msg = get_message_with_retry(message['id'])
-                
-                # Extract email data
-                headers = msg['payload'].get('headers', [])
-                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-                sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
-                
-                # Get snippet
-                snippet = msg.get('snippet', '')
-                
-                # Store sample for debugging
-                if i < 5:
-                    sample_emails.append({
-                        'subject': subject,
-                        'sender': sender,
-                        'snippet': snippet[:100] + '...' if len(snippet) > 100 else snippet
-                    })
-                
-                # Check if unread
-                if 'UNREAD' in msg.get('labelIds', []):
-                    unread_count += 1
-                
-                # Classify email
-                logger.info(f"Classifying email: {subject[:50]}...")
-                category = classifier.classify_email(subject, sender, snippet)
-                category_counts[category] += 1
-                processed_count += 1
-                
-                logger.info(f"Email classified as: {category}")
-                
-                # Break if we hit the daily limit
-                if processed_count >= DAILY_FREE_LIMIT:
-                    break
-                    
-            except Exception as e:
-                logger.error(f"Error processing message {message['id']}: {e}")
-                # Log the full traceback for more detailed error information
-                import traceback
-                logger.error(f"Full traceback for message {message['id']}: {traceback.format_exc()}")
-                continue
-        
-        # Log sample emails for debugging
-        logger.info(f"Sample of processed emails: {json.dumps(sample_emails, indent=2)}")
-        logger.info(f"Classification complete. Processed {processed_count} emails")
-        
-        # Update user usage
-        update_user_usage(user_id, processed_count)
-        
-        result = {
-            'categories': category_counts,
-            'total_processed': processed_count,
-            'unread_count': unread_count,
-            'daily_limit': DAILY_FREE_LIMIT
-        }
-        
-        logger.info(f"Returning result: {result}")
-        return jsonify(result)
+        logger.info(f"Returning job {job.id} (created: {created})")
+        return jsonify({
+            'job_id': job.id,
+            'status': job.status,
+            'created': created,
+            'status_url': url_for('api.job_status', job_id=job.id)
+        }), 202
         
+    except QueueFullError as e:
+        logger.error(f"Error queueing classification: {e}")
+        return jsonify({'error': 'Too many classification jobs, try again shortly'}), 503
     except Exception as e:
         logger.error(f"Error classifying emails: {e}")
         logger.error(f"Exception type: {type(e).__name__}")
@@ -576,7 +1269,86 @@ def classify_emails():
         logger.error(f"Full traceback: {traceback.format_exc()}")
         return jsonify({'error': 'Failed to classify emails', 'details': str(e)}), 500
 
-@app.route('/api/user/usage')
+@api.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Get a classification job's status, progress and, once finished, its result"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    job = get_user_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@api.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running classification job"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    job = get_user_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    classification_jobs.cancel(job_id)
+    return jsonify(job.to_dict())
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@api.route('/api/emails/classify/stream')
+def classify_emails_stream():
+    """Stream a classification job's progress as Server-Sent Events.
+
+    Follows the job named by ?job_id=, which must be queued first with a
+    POST to /api/emails/classify; a GET never starts a job or spends quota.
+    Emits 'progress' events with running category counts, processed count and
+    unread count, then one 'summary' event with the job's result, a
+    'cancelled' event, or a 'failed' event (not 'error', which EventSource
+    reserves for connection errors).
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    job_id = request.args.get('job_id')
+    if not job_id:
+        return jsonify({'error': 'job_id is required'}), 400
+    job = get_user_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        yield sse_event('started', {'daily_limit': DAILY_FREE_LIMIT, 'job_id': job.id})
+        version = None
+        sent_progress = None
+        while True:
+            changed = classification_jobs.wait(job, version, SSE_KEEPALIVE_SECONDS)
+            if changed == version:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            version = changed
+            
+            status, progress = job.status, job.progress
+            if progress is not None and progress is not sent_progress:
+                sent_progress = progress
+                yield sse_event('progress', progress)
+            if status == 'succeeded':
+                yield sse_event('summary', job.result)
+                return
+            if status == 'cancelled':
+                yield sse_event('cancelled', job.result or {})
+                return
+            if status == 'failed':
+                yield sse_event('failed', {'error': 'Failed to classify emails', 'details': job.error})
+                return
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Disable proxy buffering so events arrive immediately
+    })
+
+@api.route('/api/user/usage')
 def user_usage():
     """Get user's current usage statistics"""
     try:
@@ -603,23 +1375,140 @@ def user_usage():
         logger.error(f"Error getting user usage: {e}")
         return jsonify({'error': 'Failed to get usage data'}), 500
 
-@app.route('/api/auth/logout', methods=['POST'])
+@api.route('/api/summary')
+def category_summary():
+    """Get the user's stored category counts per day and over the requested window"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        try:
+            days = min(max(int(request.args.get('days', SUMMARY_DEFAULT_DAYS)), 1), SUMMARY_MAX_DAYS)
+        except ValueError:
+            return jsonify({'error': 'days must be an integer'}), 400
+        
+        today = datetime.now().date()
+        since = (today - timedelta(days=days - 1)).isoformat()
+        rows = get_daily_summary(session['user_id'], since)
+        
+        # Rows are already aggregated; only fold them into the response shape
+        totals = {category: 0 for category in CATEGORIES}
+        history = {}
+        for row in rows:
+            count = row['email_count']
+            if count <= 0:
+                continue
+            day = history.setdefault(row['day'], {category: 0 for category in CATEGORIES})
+            day[row['category']] = day.get(row['category'], 0) + count
+            totals[row['category']] = totals.get(row['category'], 0) + count
+        
+        return jsonify({
+            'since': since,
+            'days': days,
+            'totals': totals,
+            'total_classified': sum(totals.values()),
+            'today': history.get(today.isoformat(), {category: 0 for category in CATEGORIES}),
+            'history': [{'date': date, 'categories': counts} for date, counts in history.items()]
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting category summary: {e}")
+        return jsonify({'error': 'Failed to get category summary'}), 500
+
+@api.route('/api/auth/logout', methods=['POST'])
 def logout():
     """Logout user and clear session"""
+    if 'user_id' in session:
+        credential_cache.invalidate(session['user_id'])
+        user_cache.invalidate(session['user_id'])
     session.clear()
     return jsonify({'success': True})
 
-@app.route('/health')
+def cache_metrics():
+    """Return {(cache, field): value} for the in-process caches"""
+    values = {}
+    user = user_cache.stats()
+    values.update({('user', 'hits'): user['hits'], ('user', 'misses'): user['misses'], ('user', 'entries'): user['size']})
+    credential = credential_cache.stats()
+    values.update({('credential', 'hits'): credential['hits'], ('credential', 'misses'): credential['refreshes'],
+                   ('credential', 'entries'): credential['size']})
+    if classification_cache.loaded:
+        classification = classification_cache.get().stats()
+        values.update({
+            ('classification', 'hits'): classification['memory_hits'] + classification['disk_hits'],
+            ('classification', 'misses'): classification['misses'],
+            ('classification', 'entries'): classification['memory_size']
+        })
+    return values
+
+def cache_metric(field):
+    """Return {(cache,): value} for one field of every in-process cache"""
+    return {(cache,): value for (cache, name), value in cache_metrics().items() if name == field}
+
+# Gauges and counters read from existing component stats when /metrics is scraped
+CallbackMetric('cache_hits_total', 'In-process cache hits', lambda: cache_metric('hits'),
+               labels=('cache',), type='counter')
+CallbackMetric('cache_misses_total', 'In-process cache misses (credential cache: token refreshes)',
+               lambda: cache_metric('misses'), labels=('cache',), type='counter')
+CallbackMetric('cache_entries', 'Entries held by in-process caches', lambda: cache_metric('entries'),
+               labels=('cache',))
+CallbackMetric('jobs', 'Classification jobs by state',
+               lambda: {(state,): classification_jobs.stats()[state] for state in ('queued', 'running')},
+               labels=('state',))
+CallbackMetric('jobs_finished_total', 'Finished classification jobs by status',
+               lambda: {(status,): classification_jobs.stats()[status] for status in ('succeeded', 'failed', 'cancelled')},
+               labels=('status',), type='counter')
+CallbackMetric('pipeline_queue_depth', 'Items waiting in each classification pipeline stage queue',
+               lambda: {(stage,): values['queue_depth'] for stage, values in pipeline_stats.stats().items()},
+               labels=('stage',))
+CallbackMetric('pipeline_items_total', 'Items handled by each classification pipeline stage',
+               lambda: {(stage,): values['items'] for stage, values in pipeline_stats.stats().items()},
+               labels=('stage',), type='counter')
+CallbackMetric('gemini_rate_limit_per_minute', 'Current adaptive Gemini request rate',
+               lambda: gemini_rate_limiter.stats()['rate_per_minute'])
+CallbackMetric('gemini_rate_limit_waiting', 'Callers waiting on the Gemini rate limiter',
+               lambda: gemini_rate_limiter.stats()['queue_depth'])
+CallbackMetric('gemini_rate_limit_wait_seconds_total', 'Seconds callers spent waiting on the Gemini rate limiter',
+               lambda: gemini_rate_limiter.stats()['total_wait_seconds'], type='counter')
+CallbackMetric('write_behind_backlog', 'Rows waiting to be written',
+               lambda: persistence_buffer.stats()['backlog_rows'])
+CallbackMetric('write_behind_failures_total', 'Failed write-behind flushes',
+               lambda: persistence_buffer.stats()['failures'], type='counter')
+CallbackMetric('write_behind_dropped_rows_total', 'Rows dropped after repeated write-behind failures',
+               lambda: persistence_buffer.stats()['dropped_rows'], type='counter')
+CallbackMetric('log_records_dropped_total', 'Log records dropped by sampling or a full log queue',
+               lambda: {('sampled',): log_handler.stats().get('dropped_sampled', 0),
+                        ('queue_full',): log_handler.stats()['dropped_queue_full']},
+               labels=('reason',), type='counter')
+
+@api.route('/metrics')
+def metrics():
+    """Prometheus metrics for this process"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/health')
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'google_oauth_configured': bool(GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET),
         'gemini_configured': bool(GEMINI_API_KEY),
-        'encryption_configured': bool(ENCRYPTION_KEY)
+        'encryption_configured': bool(os.environ.get('ENCRYPTION_KEY')),
+        'services': {service.name: service.stats() for service in LAZY_SERVICES},
+        'classification_cache': classification_cache.get().stats() if classification_cache.loaded else None,
+        'sender_index': sender_index.stats(),
+        'local_model_loaded': local_model.loaded and local_model.get() is not None,
+        'gemini_rate_limiter': gemini_rate_limiter.stats(),
+        'credential_cache': credential_cache.stats(),
+        'user_cache': user_cache.stats(),
+        'write_behind': persistence_buffer.stats(),
+        'http_transport': google_transport.get().stats() if google_transport.loaded else None,
+        'classification_jobs': classification_jobs.stats(),
+        'pipeline': pipeline_stats.stats(),
+        'logging': log_handler.stats()
     })
 
-@app.route('/debug/session')
+@api.route('/debug/session')
 def debug_session():
     """Debug endpoint to check session state"""
     return jsonify({
@@ -632,7 +1521,7 @@ def debug_session():
         'permanent': session.permanent
     })
 
-@app.route('/debug/test-classifier', methods=['POST'])
+@api.route('/debug/test-classifier', methods=['POST'])
 def test_classifier():
     """Debug endpoint to test Gemini classifier"""
     try:
@@ -642,7 +1531,7 @@ def test_classifier():
         snippet = data.get('snippet', 'This is a test email')
         
         # Test the classifier
-        result = classifier.classify_email(subject, sender, snippet)
+        result = classifier.get().classify_email(subject, sender, snippet)
         
         # Also test with some predefined examples
         test_cases = [
@@ -670,7 +1559,7 @@ def test_classifier():
         
         test_results = []
         for test in test_cases:
-            category = classifier.classify_email(test['subject'], test['sender'], test['snippet'])
+            category = classifier.get().classify_email(test['subject'], test['sender'], test['snippet'])
             test_results.append({
                 'subject': test['subject'],
                 'expected_category': 'Shopping' if 'Amazon' in test['subject'] else 
@@ -694,5 +1583,27 @@ def test_classifier():
         logger.error(f"Traceback: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
+def create_app():
+    """Create the Flask app; clients are built on first use, not here"""
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))
+    
+    # Configure session for cross-origin requests
+    app.config.update(
+        SESSION_COOKIE_SECURE=False,  # Set to True in production with HTTPS
+        SESSION_COOKIE_HTTPONLY=True,
+        SESSION_COOKIE_SAMESITE='Lax',  # Allow cross-origin requests
+        PERMANENT_SESSION_LIFETIME=timedelta(hours=24)
+    )
+    
+    # Enable CORS for frontend
+    CORS(app, origins=['http://localhost:5173', 'http://localhost:5174', 'http://localhost:5175'], supports_credentials=True)
+    
+    app.register_blueprint(api)
+    return app
+
+# Module-level instance for `python app.py` and WSGI servers pointed at app:app
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(subject, sender, snippet, prompt_version, model_name):
+    """Build a content-addressed key from the normalized email fields"""
+    def normalize(value):
+        # Collapse whitespace and case so trivial differences share an entry
+        return ' '.join(str(value or '').split()).lower()
+
+    payload = '\x1f'.join([
+        normalize(subject),
+        normalize(sender),
+        normalize(snippet),
+        str(prompt_version),
+        str(model_name)
+    ])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ClassificationCache:
+    """Two-tier cache of email categories: a bounded in-process LRU backed by
+    an optional SQLite file that survives restarts"""
+
+    def __init__(self, max_size=10000, ttl_seconds=604800, db_path=None, db_max_rows=100000):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.db_max_rows = db_max_rows
+        self._memory = OrderedDict()  # key -> (category, expires_at)
+        self._lock = threading.Lock()
+        self._db = None
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS classification_cache ('
+                    'key TEXT PRIMARY KEY, category TEXT NOT NULL, expires_at REAL NOT NULL)'
+                )
+                self._db.execute(
+                    'CREATE INDEX IF NOT EXISTS idx_classification_cache_expires_at '
+                    'ON classification_cache(expires_at)'
+                )
+                self._db.commit()
+                logger.info(f"Classification cache disk tier enabled at {db_path}")
+            except sqlite3.Error as e:
+                logger.error(f"Could not open classification cache database {db_path}: {e}")
+                self._db = None
+
+    def get(self, key):
+        """Return the cached category for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                category, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return category
+                del self._memory[key]
+                self._stats['expirations'] += 1
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        'SELECT category, expires_at FROM classification_cache WHERE key = ?',
+                        (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"Classification cache read failed: {e}")
+                    row = None
+                if row and row[1] > now:
+                    # Promote to the memory tier
+                    self._set_memory(key, row[0], row[1])
+                    self._stats['disk_hits'] += 1
+                    return row[0]
+
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, key, category):
+        """Store a category in both tiers"""
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._set_memory(key, category, expires_at)
+            self._stats['sets'] += 1
+
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO classification_cache (key, category, expires_at) '
+                        'VALUES (?, ?, ?)',
+                        (key, category, expires_at)
+                    )
+                    # Prune occasionally rather than on every write
+                    if self._stats['sets'] % 500 == 0:
+                        self._prune_disk()
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Classification cache write failed: {e}")
+
+    def _set_memory(self, key, category, expires_at):
+        """Insert into the LRU tier, evicting the oldest entries beyond max_size"""
+        self._memory[key] = (category, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _prune_disk(self):
+        """Drop expired rows and trim the disk tier to db_max_rows"""
+        self._db.execute('DELETE FROM classification_cache WHERE expires_at <= ?', (time.time(),))
+        self._db.execute(
+            'DELETE FROM classification_cache WHERE key IN ('
+            'SELECT key FROM classification_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+            (self.db_max_rows,)
+        )
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_size'] = len(self._memory)
+            stats['disk_enabled'] = self._db is not None
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
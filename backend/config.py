@@ -20,6 +20,10 @@ class Config:
     SUPABASE_URL = os.environ.get('SUPABASE_URL')
     SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
     
+    # Storage backend: 'supabase', or 'sqlite' for a local file with the same schema
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'supabase')
+    SQLITE_DB_PATH = os.environ.get('SQLITE_DB_PATH', 'data/inbox_clarity.db')
+    
     # Security
     ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY')
     
@@ -27,6 +31,53 @@ class Config:
     DAILY_FREE_LIMIT = int(os.environ.get('DAILY_FREE_LIMIT', '100'))
     MAX_EMAILS_PER_REQUEST = int(os.environ.get('MAX_EMAILS_PER_REQUEST', '100'))
     API_TIMEOUT = int(os.environ.get('API_TIMEOUT', '120')) # Default to 120 seconds
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '10')) # Keep-alive connections per Google transport
+    CLASSIFY_BATCH_SIZE = int(os.environ.get('CLASSIFY_BATCH_SIZE', '25')) # Emails per Gemini prompt
+    CLASSIFY_CONCURRENCY = int(os.environ.get('CLASSIFY_CONCURRENCY', '8')) # Parallel Gemini batches per chunk (1 = sequential)
+    GMAIL_BATCH_SIZE = int(os.environ.get('GMAIL_BATCH_SIZE', '50')) # Metadata requests per Gmail batch (max 100)
+    SCAN_PAGE_SIZE = int(os.environ.get('SCAN_PAGE_SIZE', '100')) # Message IDs per messages.list page (max 500)
+    PIPELINE_FETCH_WORKERS = int(os.environ.get('PIPELINE_FETCH_WORKERS', '4')) # Concurrent Gmail batch requests per run
+    PIPELINE_CLASSIFY_WORKERS = int(os.environ.get('PIPELINE_CLASSIFY_WORKERS', '4')) # Chunks classified at once per run
+    PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', '4')) # Chunks buffered between pipeline stages
+    PERSIST_BATCH_SIZE = int(os.environ.get('PERSIST_BATCH_SIZE', '500')) # Rows per classified_emails upsert
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', '2')) # Max seconds results wait to be written
+    WRITE_BEHIND_MAX_ROWS = int(os.environ.get('WRITE_BEHIND_MAX_ROWS', '10000')) # Buffered rows before runs wait for the writer
+    WRITE_BEHIND_MAX_ATTEMPTS = int(os.environ.get('WRITE_BEHIND_MAX_ATTEMPTS', '5')) # Writes of a failing batch before it is dropped
+    WRITE_BEHIND_ADD_TIMEOUT = float(os.environ.get('WRITE_BEHIND_ADD_TIMEOUT', '30')) # Max seconds a run waits on a full buffer
+    SYNC_MAX_TRACKED_MESSAGES = int(os.environ.get('SYNC_MAX_TRACKED_MESSAGES', str(MAX_EMAILS_PER_REQUEST))) # Inbox window counted on the dashboard
+    
+    # Shared Gemini rate limiter (requests per minute, adapted on ResourceExhausted)
+    GEMINI_RATE_INITIAL_RPM = float(os.environ.get('GEMINI_RATE_INITIAL_RPM', '15'))
+    GEMINI_RATE_MIN_RPM = float(os.environ.get('GEMINI_RATE_MIN_RPM', '2'))
+    GEMINI_RATE_MAX_RPM = float(os.environ.get('GEMINI_RATE_MAX_RPM', '60'))
+    GEMINI_RATE_BURST = int(os.environ.get('GEMINI_RATE_BURST', '5'))
+    
+    # Refreshed OAuth credentials kept in memory per user
+    CREDENTIAL_CACHE_SIZE = int(os.environ.get('CREDENTIAL_CACHE_SIZE', '1000'))
+    
+    # users rows cached in memory; the backend invalidates them on its own writes
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '1000'))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '30')) # Seconds
+    
+    # Background classification jobs (one active job per user)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4')) # Classification runs executed at once
+    JOB_MAX_QUEUED = int(os.environ.get('JOB_MAX_QUEUED', '100')) # Waiting jobs before new ones are refused
+    JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', '3600')) # How long finished job results stay available
+    AFFINITY_COOKIE_NAME = os.environ.get('AFFINITY_COOKIE_NAME', 'inbox_clarity_affinity') # Stable per-user cookie a load balancer can pin on
+    
+    # Classification cache (set CLASSIFICATION_CACHE_DB to a file path to persist across restarts)
+    CLASSIFICATION_CACHE_SIZE = int(os.environ.get('CLASSIFICATION_CACHE_SIZE', '10000'))
+    CLASSIFICATION_CACHE_TTL = int(os.environ.get('CLASSIFICATION_CACHE_TTL', '604800')) # 7 days
+    CLASSIFICATION_CACHE_DB = os.environ.get('CLASSIFICATION_CACHE_DB', '')
+    CLASSIFICATION_CACHE_DB_MAX_ROWS = int(os.environ.get('CLASSIFICATION_CACHE_DB_MAX_ROWS', '100000'))
+    
+    # Sender index: answer for a sender once it has this many results, nearly all in one category
+    SENDER_INDEX_MIN_COUNT = int(os.environ.get('SENDER_INDEX_MIN_COUNT', '5'))
+    SENDER_INDEX_MIN_CONFIDENCE = float(os.environ.get('SENDER_INDEX_MIN_CONFIDENCE', '0.95'))
+    
+    # Local first-pass classifier: emails below the threshold are sent to Gemini
+    LOCAL_MODEL_PATH = os.environ.get('LOCAL_MODEL_PATH', 'models/local_classifier.npz')
+    LOCAL_MODEL_THRESHOLD = float(os.environ.get('LOCAL_MODEL_THRESHOLD', '0.9'))
 
     # Email Categories
     EMAIL_CATEGORIES = [
@@ -40,6 +91,9 @@ class Config:
     # Logging Configuration
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+    LOG_STRUCTURED = os.environ.get('LOG_STRUCTURED', 'true').lower() == 'true' # One JSON object per line; 'false' for LOG_FORMAT text
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000')) # Records waiting for the log writer thread before new ones are dropped
+    LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', '100')) # Keep one in this many per-email debug records
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
@@ -0,0 +1,80 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialCache:
+    """Per-user cache of refreshed Google OAuth credentials.
+
+    Entries are keyed on user_id and remember a fingerprint of the refresh
+    token they were built from, so a new login replaces them. Credentials
+    are refreshed only when google-auth reports them as no longer valid
+    (which already allows for clock skew), and each user has their own lock
+    so concurrent requests trigger a single refresh.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (fingerprint, credentials)
+        self._user_locks = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'refreshes': 0, 'evictions': 0}
+
+    @staticmethod
+    def _fingerprint(refresh_token):
+        return hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+
+    def _user_lock(self, user_id):
+        with self._lock:
+            lock = self._user_locks.get(user_id)
+            if lock is None:
+                lock = self._user_locks[user_id] = threading.Lock()
+            return lock
+
+    def get(self, user_id, refresh_token, build_credentials, refresh):
+        """Return valid credentials for user_id, building or refreshing them as needed.
+
+        build_credentials(refresh_token) creates new credentials and
+        refresh(credentials) refreshes them in place.
+        """
+        fingerprint = self._fingerprint(refresh_token)
+        with self._user_lock(user_id):
+            with self._lock:
+                entry = self._entries.get(user_id)
+                if entry is not None:
+                    self._entries.move_to_end(user_id)
+
+            if entry is not None and entry[0] == fingerprint:
+                credentials = entry[1]
+                if credentials.valid:
+                    with self._lock:
+                        self._stats['hits'] += 1
+                    return credentials
+            else:
+                credentials = build_credentials(refresh_token)
+
+            refresh(credentials)
+            with self._lock:
+                self._stats['refreshes'] += 1
+                self._entries[user_id] = (fingerprint, credentials)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._user_locks.pop(evicted, None)
+                    self._stats['evictions'] += 1
+            return credentials
+
+    def invalidate(self, user_id):
+        """Forget a user's credentials, e.g. on logout"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        """Return hit/refresh counters and the number of cached users"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        return stats
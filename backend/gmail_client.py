@@ -0,0 +1,290 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type, retry_if_not_exception_type
+
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+GMAIL_REQUEST_SECONDS = Histogram(
+    'gmail_request_seconds', 'Gmail API HTTP request latency, including pooled connection checkout',
+    labels=('operation', 'outcome')
+)
+GMAIL_MESSAGES_FETCHED = Counter(
+    'gmail_messages_fetched_total', 'Messages requested through batch messages.get calls',
+    labels=('outcome',)
+)
+
+# Gmail accepts up to 100 calls per batch but recommends 50 to avoid rate limiting
+GMAIL_MAX_BATCH_SIZE = 100
+
+# Largest page messages.list will return
+GMAIL_MAX_PAGE_SIZE = 500
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Mailbox changes that can affect which INBOX messages we count and how
+HISTORY_TYPES = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+
+# Partial-response masks: ask Gmail only for the fields we read
+MESSAGE_FIELDS = 'id,snippet,labelIds,internalDate,payload/headers'
+LIST_FIELDS = 'messages/id,nextPageToken'
+HISTORY_FIELDS = (
+    'history(messagesAdded/message(id,labelIds),messagesDeleted/message/id,'
+    'labelsAdded(message/id,labelIds),labelsRemoved(message/id,labelIds)),'
+    'nextPageToken,historyId'
+)
+LABEL_COUNT_FIELDS = 'messagesTotal,messagesUnread'
+
+
+class HistoryExpiredError(Exception):
+    """Raised when Gmail no longer has history for the stored historyId"""
+
+
+_discovery_document = None
+_discovery_lock = threading.Lock()
+
+
+def get_discovery_document():
+    """Load and parse the bundled Gmail discovery document once per process"""
+    global _discovery_document
+    if _discovery_document is None:
+        with _discovery_lock:
+            if _discovery_document is None:
+                from googleapiclient import discovery_cache
+                document = discovery_cache.get_static_doc('gmail', 'v1')
+                if document is None:
+                    return None
+                _discovery_document = json.loads(document)
+                logger.info("Loaded Gmail discovery document")
+    return _discovery_document
+
+
+def _http_scope(http_factory):
+    """Return a context manager yielding the http object to execute with.
+
+    http_factory is a callable returning a context manager (for example a
+    pooled connection); without one the service's own http is used.
+    """
+    return http_factory() if http_factory else nullcontext(None)
+
+
+@contextmanager
+def _gmail_call(operation, http_factory):
+    """Yield the http object for one Gmail HTTP request and record its latency"""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        with _http_scope(http_factory) as http:
+            yield http
+        outcome = 'success'
+    finally:
+        GMAIL_REQUEST_SECONDS.labels(operation, outcome).observe(time.perf_counter() - start)
+
+
+def build_gmail_service(credentials):
+    """Build a Gmail service from the cached discovery document"""
+    from googleapiclient.discovery import build, build_from_document
+    document = get_discovery_document()
+    if document is None:
+        # No bundled document for this client version; let build() find one
+        return build('gmail', 'v1', credentials=credentials)
+    return build_from_document(document, credentials=credentials)
+
+
+def is_retryable(exception):
+    """Return True for sub-request failures worth retrying"""
+    from googleapiclient.errors import HttpError
+    if isinstance(exception, HttpError):
+        return exception.resp.status in RETRYABLE_STATUSES
+    return True
+
+
+def parse_message(msg):
+    """Extract the fields used for classification from a metadata response"""
+    headers = msg.get('payload', {}).get('headers', [])
+    return {
+        'id': msg['id'],
+        'subject': next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject'),
+        'sender': next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender'),
+        'snippet': msg.get('snippet', ''),
+        'unread': 'UNREAD' in msg.get('labelIds', []),
+        'date': int(msg.get('internalDate', 0))
+    }
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(Exception))
+def _list_page(service, label_ids, page_size, page_token, http_factory):
+    with _gmail_call('messages.list', http_factory) as http:
+        return service.users().messages().list(
+            userId='me',
+            labelIds=label_ids,
+            maxResults=page_size,
+            pageToken=page_token,
+            fields=LIST_FIELDS
+        ).execute(http=http)
+
+
+def iter_message_ids(service, label_ids=('INBOX',), budget=None, page_size=100, http_factory=None,
+                     page_token=None, cursor=None):
+    """Yield message IDs newest first, following nextPageToken lazily.
+
+    Only one page is held at a time and the next page is requested only
+    when the consumer asks for more, so stopping early costs nothing.
+    Stops after budget IDs when a budget is given. Listing starts at
+    page_token when one is given. If cursor is a dict it is kept up to
+    date as pages are read: 'unyielded' holds the IDs of the current page
+    not handed out yet, 'page_token' the next page (None at the end) and
+    'budget' what is left of the budget after them, so a later call can
+    carry on where this one stopped.
+    """
+    page_size = max(1, min(page_size, GMAIL_MAX_PAGE_SIZE))
+    if cursor is None:
+        cursor = {}
+    while budget is None or budget > 0:
+        if budget is not None:
+            page_size = min(page_size, budget)
+        response = _list_page(service, list(label_ids), page_size, page_token, http_factory)
+        message_ids = deque(message['id'] for message in response.get('messages', []))
+        if budget is not None:
+            while len(message_ids) > budget:
+                message_ids.pop()
+            budget -= len(message_ids)
+        page_token = response.get('nextPageToken') if budget != 0 else None
+        cursor.update(unyielded=message_ids, page_token=page_token, budget=budget)
+        while message_ids:
+            yield message_ids.popleft()
+        if not page_token:
+            return
+
+
+def fetch_message_metadata(service, message_ids, http_factory=None, batch_size=50,
+                           max_attempts=3, retry_wait=2, max_workers=1):
+    """Fetch Subject/From metadata for many messages through Gmail batch requests.
+
+    Returns a dict of message id -> parsed message. Only sub-requests that
+    failed with a retryable error are resent on the next attempt; messages
+    that still fail are logged and left out. Batches run on up to
+    max_workers threads, each executing with an http object from http_factory.
+    """
+    batch_size = max(1, min(batch_size, GMAIL_MAX_BATCH_SIZE))
+    results = {}
+    lock = threading.Lock()
+    pending = list(dict.fromkeys(message_ids))
+
+    def run_batch(chunk):
+        failed = []
+        outcomes = {'success': 0, 'error': 0}
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                try:
+                    parsed = parse_message(response)
+                except Exception as e:
+                    logger.error(f"Error parsing message {request_id}: {e}")
+                    outcomes['error'] += 1
+                    return
+                with lock:
+                    results[request_id] = parsed
+                outcomes['success'] += 1
+            elif is_retryable(exception):
+                failed.append(request_id)
+            else:
+                logger.error(f"Error fetching message {request_id}: {exception}")
+                outcomes['error'] += 1
+
+        batch = service.new_batch_http_request(callback=callback)
+        for message_id in chunk:
+            batch.add(
+                service.users().messages().get(
+                    userId='me',
+                    id=message_id,
+                    format='metadata',
+                    metadataHeaders=['Subject', 'From'],
+                    fields=MESSAGE_FIELDS
+                ),
+                request_id=message_id
+            )
+        try:
+            with _gmail_call('messages.batchGet', http_factory) as http:
+                batch.execute(http=http)
+        except Exception as e:
+            # The whole batch failed; retry every message that has no result
+            logger.error(f"Gmail batch request for {len(chunk)} messages failed: {e}")
+            with lock:
+                failed = [message_id for message_id in chunk if message_id not in results]
+        outcomes['retryable_error'] = len(failed)
+        for outcome, count in outcomes.items():
+            if count:
+                GMAIL_MESSAGES_FETCHED.labels(outcome).inc(count)
+        return failed
+
+    for attempt in range(max_attempts):
+        chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        logger.debug("Fetching %d messages in %d batch requests (attempt %d)", len(pending), len(chunks), attempt + 1)
+        if max_workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+                failed_lists = list(executor.map(run_batch, chunks))
+        else:
+            failed_lists = [run_batch(chunk) for chunk in chunks]
+
+        pending = [message_id for failed in failed_lists for message_id in failed]
+        if not pending:
+            break
+        if attempt + 1 < max_attempts:
+            time.sleep(retry_wait * (2 ** attempt))
+
+    if pending:
+        logger.error(f"Giving up on {len(pending)} messages after {max_attempts} attempts")
+    return results
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(Exception))
+def get_history_id(service, http_factory=None):
+    """Return the mailbox's current historyId"""
+    with _gmail_call('getProfile', http_factory) as http:
+        return service.users().getProfile(userId='me', fields='historyId').execute(http=http)['historyId']
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(Exception))
+def get_label_counts(service, label_id='INBOX', http_factory=None):
+    """Return (total, unread) message counts for a label from a single labels.get call"""
+    with _gmail_call('labels.get', http_factory) as http:
+        label = service.users().labels().get(userId='me', id=label_id, fields=LABEL_COUNT_FIELDS).execute(http=http)
+    return label.get('messagesTotal', 0), label.get('messagesUnread', 0)
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_not_exception_type(HistoryExpiredError))
+def list_history(service, start_history_id, http_factory=None):
+    """Return (records, latest_history_id) for every change since start_history_id.
+
+    Raises HistoryExpiredError when the start point is too old, in which
+    case the caller should fall back to a full scan.
+    """
+    from googleapiclient.errors import HttpError
+    records = []
+    page_token = None
+    while True:
+        try:
+            with _gmail_call('history.list', http_factory) as http:
+                response = service.users().history().list(
+                    userId='me',
+                    startHistoryId=start_history_id,
+                    historyTypes=HISTORY_TYPES,
+                    pageToken=page_token,
+                    fields=HISTORY_FIELDS
+                ).execute(http=http)
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise HistoryExpiredError(f"History {start_history_id} is no longer available") from e
+            raise
+        records.extend(response.get('history', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return records, response.get('historyId', start_history_id)
@@ -0,0 +1,49 @@
+"""
+Gunicorn settings for serving the backend in production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Gmail and Gemini work runs on the classification job queue, so request
+threads only wait on short storage reads and on progress streams, which
+sleep on a condition variable until their job changes. Threaded workers
+(gthread) suit that: an idle stream costs one parked thread and no CPU.
+Size GUNICORN_THREADS above the number of progress streams expected at
+once plus headroom for ordinary requests.
+
+Jobs, their progress and the write-behind buffer live in the worker
+process that accepted the request, so job status requests must reach the
+same process. Keep GUNICORN_WORKERS at 1 unless requests are pinned to a
+worker (see DEPLOYMENT.md); scale a single worker with threads and
+JOB_WORKERS instead.
+"""
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:5000')
+
+# One process by default; each one runs its own job queue, caches and buffers
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+worker_class = 'gthread'
+# Concurrent requests per worker, including open progress streams
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+
+# Importing the app is cheap and builds no clients, so load it once in the
+# master; each worker opens its own connections on first use after fork
+preload_app = True
+
+# Worker heartbeat timeout; gthread workers stay alive during long streams
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+# Time given to running requests and the write-behind flush on shutdown
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Seconds to hold idle keep-alive connections from the reverse proxy
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def worker_exit(server, worker):
+    # Write buffered results before the worker goes away
+    from app import persistence_buffer
+    persistence_buffer.close()
@@ -0,0 +1,116 @@
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+import httplib2
+import requests
+from google.auth.transport.requests import Request
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class HttpPool:
+    """Thread-safe pool of keep-alive httplib2.Http objects for the Gmail client.
+
+    httplib2.Http keeps its connections open between requests but must not
+    be used by two threads at once, so each caller checks one out for the
+    duration of a request and returns it afterwards. At most size objects
+    exist; further callers wait for one to be returned.
+    """
+
+    def __init__(self, size=10, timeout=120):
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()  # Most recently used first, so its connection is warm
+        self._created = 0
+        self._lock = threading.Lock()
+        self._stats = {'acquired': 0, 'waited': 0}
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return httplib2.Http(timeout=self.timeout)
+            self._stats['waited'] += 1
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        """Check out an Http object for the duration of the with block"""
+        http = self._checkout()
+        with self._lock:
+            self._stats['acquired'] += 1
+        try:
+            yield http
+        finally:
+            self._idle.put(http)
+
+    def stats(self):
+        """Return pool size and how often an existing Http object was reused"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['created'] = self._created
+        stats['reused'] = stats['acquired'] - stats['created']
+        stats['idle'] = self._idle.qsize()
+        return stats
+
+
+class TimeoutRequest(Request):
+    """google-auth transport over a shared session with a default timeout"""
+
+    def __init__(self, session, timeout):
+        super().__init__(session=session)
+        self.timeout = timeout
+
+    def __call__(self, url, method='GET', body=None, headers=None, timeout=None, **kwargs):
+        return super().__call__(url, method=method, body=body, headers=headers,
+                                timeout=timeout or self.timeout, **kwargs)
+
+
+class GoogleTransport:
+    """Pooled transports for every outbound Google call the backend makes.
+
+    A single requests adapter (shared by google-auth and the OAuth flow's
+    session) keeps TLS connections to the token and certificate endpoints
+    alive, and an HttpPool does the same for the Gmail API.
+    """
+
+    def __init__(self, pool_size=10, timeout=120):
+        self.timeout = timeout
+        self.adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.auth_request = TimeoutRequest(self.session, timeout)
+        self.gmail_pool = HttpPool(size=pool_size, timeout=timeout)
+
+    def mount(self, session):
+        """Route another requests session (e.g. the OAuth flow's) through the shared pool"""
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        return session
+
+    def requests_stats(self):
+        """Return connections opened versus requests sent by the shared adapter"""
+        connections = 0
+        sent = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                sent += pool.num_requests
+        return {'connections_opened': connections, 'requests': sent}
+
+    def stats(self):
+        """Return reuse stats for both transports"""
+        return {
+            'requests': self.requests_stats(),
+            'gmail': self.gmail_pool.stats()
+        }
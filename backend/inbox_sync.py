@@ -0,0 +1,110 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def new_sync_state(history_id):
+    """Return an empty sync state starting at history_id"""
+    return {'history_id': str(history_id), 'messages': {}, 'pending': [], 'scan': None}
+
+
+def state_from_row(row):
+    """Rebuild a sync state from its stored form"""
+    data = row.get('state') or {}
+    messages = {}
+    for entry in data.get('messages', []):
+        message_id, category, unread = entry[:3]
+        date = entry[3] if len(entry) > 3 else 0
+        messages[message_id] = {'category': category, 'unread': bool(unread), 'date': date}
+    return {
+        'history_id': row.get('history_id'),
+        'messages': messages,
+        'pending': list(data.get('pending', [])),
+        'scan': data.get('scan')
+    }
+
+
+def state_to_row(user_id, state):
+    """Serialize a sync state; messages are stored as compact [id, category, unread, date] lists"""
+    return {
+        'user_id': user_id,
+        'history_id': str(state['history_id']),
+        'state': {
+            'messages': [
+                [message_id, info['category'], info['unread'], info.get('date', 0)]
+                for message_id, info in state['messages'].items()
+            ],
+            'pending': state['pending'],
+            'scan': state.get('scan')
+        }
+    }
+
+
+def apply_history(state, records):
+    """Apply Gmail history records in order and return the message IDs to classify.
+
+    Messages leaving INBOX or deleted are dropped along with their counts,
+    UNREAD changes update tracked messages in place, and messages entering
+    INBOX are returned (after any pending ones) for classification.
+    """
+    messages = state['messages']
+    to_classify = dict.fromkeys(state['pending'])
+
+    def drop(message_id):
+        messages.pop(message_id, None)
+        to_classify.pop(message_id, None)
+
+    for record in records:
+        for item in record.get('messagesAdded', []):
+            message = item.get('message', {})
+            if 'INBOX' in message.get('labelIds', []) and message.get('id') not in messages:
+                to_classify[message['id']] = None
+
+        for item in record.get('messagesDeleted', []):
+            drop(item.get('message', {}).get('id'))
+
+        for item in record.get('labelsAdded', []):
+            message_id = item.get('message', {}).get('id')
+            labels = item.get('labelIds', [])
+            if 'INBOX' in labels and message_id not in messages:
+                to_classify[message_id] = None
+            if 'UNREAD' in labels and message_id in messages:
+                messages[message_id]['unread'] = True
+
+        for item in record.get('labelsRemoved', []):
+            message_id = item.get('message', {}).get('id')
+            labels = item.get('labelIds', [])
+            if 'INBOX' in labels:
+                drop(message_id)
+            elif 'UNREAD' in labels and message_id in messages:
+                messages[message_id]['unread'] = False
+
+    state['pending'] = []
+    return [message_id for message_id in to_classify if message_id]
+
+
+def record_results(state, emails, categories, max_tracked):
+    """Add newly classified emails to the state, keeping the newest max_tracked messages"""
+    messages = state['messages']
+    for email, category in zip(emails, categories):
+        if category is None:
+            continue
+        messages[email['id']] = {'category': category, 'unread': email['unread'], 'date': email.get('date', 0)}
+
+    excess = len(messages) - max_tracked
+    if excess > 0:
+        oldest = sorted(messages, key=lambda message_id: messages[message_id].get('date', 0))[:excess]
+        for message_id in oldest:
+            del messages[message_id]
+
+
+def summarize(state, categories):
+    """Return (category_counts, unread_count) over every tracked message"""
+    category_counts = {category: 0 for category in categories}
+    unread_count = 0
+    for info in state['messages'].values():
+        if info['category'] in category_counts:
+            category_counts[info['category']] += 1
+        if info['unread']:
+            unread_count += 1
+    return category_counts, unread_count
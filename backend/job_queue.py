@@ -0,0 +1,181 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+class Job:
+    """One queued classification run and its latest state"""
+
+    def __init__(self, user_id, args):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.version = 0
+        self._args = args  # Runner arguments, never exposed through to_dict; cleared once taken
+
+    @property
+    def finished(self):
+        return self.status not in ACTIVE_STATUSES
+
+    def to_dict(self):
+        """Return the job's public state"""
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class JobQueue:
+    """In-process job queue executed by a fixed pool of worker threads.
+
+    Each user has at most one queued or running job; submitting again
+    returns the active one. Workers start on the first submit, so importing
+    the app (or forking workers) does not spawn threads. Finished jobs are
+    kept for retention_seconds so clients can fetch their results.
+    """
+
+    def __init__(self, runner, workers=4, max_queued=100, retention_seconds=3600):
+        self.runner = runner
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._active_by_user = {}
+        self._threads = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stats = {'submitted': 0, 'deduplicated': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0}
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _prune(self, now):
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.retention_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, user_id, *args):
+        """Queue a job for user_id, returning (job, created)"""
+        with self._lock:
+            active = self._active_by_user.get(user_id)
+            if active is not None and not active.finished:
+                self._stats['deduplicated'] += 1
+                return active, False
+
+            self._prune(time.time())
+            if self._queue.qsize() >= self.max_queued:
+                raise QueueFullError("Too many classification jobs are waiting")
+
+            job = Job(user_id, args)
+            self._jobs[job.id] = job
+            self._active_by_user[user_id] = job
+            self._stats['submitted'] += 1
+            self._start_workers()
+        self._queue.put(job)
+        logger.info(f"Queued job {job.id} for user {user_id}")
+        return job, True
+
+    def get(self, job_id):
+        """Return the job with job_id, or None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job; a running job stops at its next checkpoint"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel_event.set()
+            if job.status == 'queued':
+                self._finish(job, 'cancelled')
+            return job
+
+    def update_progress(self, job, progress):
+        """Record a progress snapshot and wake anyone waiting on the job"""
+        with self._lock:
+            job.progress = progress
+            job.version += 1
+            self._changed.notify_all()
+
+    def wait(self, job, version, timeout):
+        """Block until the job changes past version or timeout passes; returns the new version"""
+        with self._lock:
+            self._changed.wait_for(lambda: job.version != version, timeout)
+            return job.version
+
+    def _finish(self, job, status, result=None, error=None):
+        # Caller holds the lock
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.version += 1
+        # Arguments may hold credentials; finished jobs are kept for polling
+        job._args = None
+        self._stats[status] += 1
+        if self._active_by_user.get(job.user_id) is job:
+            del self._active_by_user[job.user_id]
+        self._changed.notify_all()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.finished:
+                    # Cancelled while queued
+                    continue
+                job.status = 'running'
+                job.started_at = time.time()
+                args, job._args = job._args, None
+                job.version += 1
+                self._changed.notify_all()
+
+            try:
+                result = self.runner(job, *args)
+                with self._lock:
+                    self._finish(job, 'cancelled' if job.cancel_event.is_set() else 'succeeded', result=result)
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {e}")
+                with self._lock:
+                    self._finish(job, 'failed', error=str(e))
+
+    def stats(self):
+        """Return queue depth, running jobs and outcome counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            statuses = [job.status for job in self._jobs.values()]
+            stats['workers'] = len(self._threads)
+        stats['queued'] = statuses.count('queued')
+        stats['running'] = statuses.count('running')
+        return stats
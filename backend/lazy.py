@@ -0,0 +1,51 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Distinguishes "not built yet" from a factory that returned None
+_MISSING = object()
+
+
+class LazyValue:
+    """Builds a value with factory() on first get() and reuses it afterwards.
+
+    Lets the app import without touching credentials, the network or heavy
+    client libraries: each client is created by the first request that
+    needs it, so forked workers also build their own connections. Threads
+    asking at the same time wait for a single build. If factory raises,
+    nothing is kept and the next get() tries again.
+    """
+
+    def __init__(self, factory, name=None):
+        self.factory = factory
+        self.name = name or getattr(factory, '__name__', 'value')
+        self._value = _MISSING
+        self._lock = threading.Lock()
+        self._init_seconds = None
+
+    def get(self):
+        """Return the value, building it first if needed"""
+        value = self._value
+        if value is _MISSING:
+            with self._lock:
+                value = self._value
+                if value is _MISSING:
+                    start = time.monotonic()
+                    value = self.factory()
+                    self._init_seconds = time.monotonic() - start
+                    self._value = value
+                    logger.info(f"Initialized {self.name} in {self._init_seconds:.3f}s")
+        return value
+
+    @property
+    def loaded(self):
+        return self._value is not _MISSING
+
+    def stats(self):
+        """Return whether the value has been built and how long that took"""
+        return {
+            'loaded': self.loaded,
+            'init_seconds': round(self._init_seconds, 3) if self._init_seconds is not None else None
+        }
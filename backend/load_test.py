@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Load test a running backend and report requests per second and latency.
+
+Sends --requests GET requests to each --path from --concurrency threads,
+each holding a keep-alive connection, and prints throughput, latency
+percentiles and non-2xx responses per path. Pass a session cookie copied
+from the browser to exercise authenticated endpoints.
+
+Usage:
+    gunicorn -c gunicorn.conf.py wsgi:app
+    python load_test.py
+    python load_test.py --url http://localhost:5000 --path /health --path /api/user/usage \\
+        --requests 2000 --concurrency 32 --cookie "session=..."
+"""
+
+import argparse
+import http.client
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, fraction):
+    """Return the value at fraction (0-1) of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_path(url, path, total, concurrency, cookie=None):
+    """Send total requests to path and return (elapsed_seconds, latencies, statuses)"""
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    headers = {'Cookie': cookie} if cookie else {}
+    local = threading.local()
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def send(_):
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = connection_class(parts.hostname, parts.port, timeout=60)
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException) as e:
+            # Reconnect on the next request from this thread
+            connection.close()
+            local.connection = None
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(total)))
+    return time.perf_counter() - start, sorted(latencies), statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend")
+    parser.add_argument('--url', default='http://localhost:5000', help="Base URL of the running backend")
+    parser.add_argument('--path', action='append', help="Path to request; repeat for several (default /health)")
+    parser.add_argument('--requests', type=int, default=1000, help="Requests per path")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent connections")
+    parser.add_argument('--cookie', help="Cookie header to send, e.g. session=...")
+    args = parser.parse_args()
+
+    for path in args.path or ['/health']:
+        elapsed, latencies, statuses = run_path(args.url, path, args.requests, args.concurrency, args.cookie)
+        errors = {status: count for status, count in statuses.items()
+                  if not isinstance(status, int) or status >= 400}
+        print(f"{path}: {len(latencies) / elapsed:.1f} req/s over {len(latencies)} requests "
+              f"with {args.concurrency} connections")
+        print(f"  latency ms: p50 {percentile(latencies, 0.5) * 1000:.1f}  "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f}  "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f}  "
+              f"max {latencies[-1] * 1000:.1f}")
+        if errors:
+            print(f"  errors: {errors}")
+
+
+if __name__ == '__main__':
+    main()
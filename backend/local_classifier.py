@@ -0,0 +1,147 @@
+import json
+import logging
+import re
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from sender_index import parse_sender
+
+logger = logging.getLogger(__name__)
+
+# Bump when the feature extraction or artifact layout changes
+MODEL_FORMAT_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9'$%]*")
+
+
+def email_features(subject, sender, snippet):
+    """Return the prefixed string features for one email"""
+    features = []
+    for prefix, text in (('s', subject), ('b', snippet)):
+        tokens = TOKEN_PATTERN.findall((text or '').lower())
+        features.extend(f"{prefix}:{token}" for token in tokens)
+        features.extend(f"{prefix}:{a}_{b}" for a, b in zip(tokens, tokens[1:]))
+
+    address, domain = parse_sender(sender)
+    if address:
+        features.append(f"f:{address}")
+        features.append(f"f:@{domain}")
+        features.extend(f"f:{token}" for token in TOKEN_PATTERN.findall(address.split('@', 1)[0]))
+    features.extend(f"n:{token}" for token in TOKEN_PATTERN.findall((sender or '').split('<', 1)[0].lower()))
+    return features
+
+
+class HashingVectorizer:
+    """Stateless feature hashing into a fixed number of columns"""
+
+    def __init__(self, n_features=2 ** 17):
+        self.n_features = n_features
+
+    def transform(self, emails):
+        """Return (rows, cols, counts) arrays in coordinate form for a batch of emails"""
+        rows, cols = [], []
+        for row, email in enumerate(emails):
+            for feature in email_features(email.get('subject'), email.get('sender'), email.get('snippet')):
+                rows.append(row)
+                cols.append(zlib.crc32(feature.encode('utf-8')) % self.n_features)
+
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.float32)
+
+        # Merge duplicate (row, col) pairs into counts
+        keys = np.asarray(rows, dtype=np.int64) * self.n_features + np.asarray(cols, dtype=np.int64)
+        unique, counts = np.unique(keys, return_counts=True)
+        return unique // self.n_features, unique % self.n_features, counts.astype(np.float32)
+
+
+class LocalClassifier:
+    """Multinomial naive Bayes over hashed email features"""
+
+    def __init__(self, categories, n_features=2 ** 17, alpha=0.1):
+        self.categories = list(categories)
+        self.vectorizer = HashingVectorizer(n_features)
+        self.alpha = alpha
+        self.class_log_prior = None
+        self.feature_log_prob = None
+        self.metadata = {}
+
+    def fit(self, emails, labels):
+        """Train from emails (dicts with subject/sender/snippet) and their category labels"""
+        label_index = {category: i for i, category in enumerate(self.categories)}
+        pairs = [(email, label_index[label]) for email, label in zip(emails, labels) if label in label_index]
+        if not pairs:
+            raise ValueError("No training rows with a known category")
+
+        targets = np.array([target for _, target in pairs], dtype=np.int64)
+        rows, cols, counts = self.vectorizer.transform([email for email, _ in pairs])
+
+        n_classes = len(self.categories)
+        feature_counts = np.zeros((n_classes, self.vectorizer.n_features), dtype=np.float64)
+        np.add.at(feature_counts, (targets[rows], cols), counts)
+
+        class_counts = np.bincount(targets, minlength=n_classes).astype(np.float64)
+        self.class_log_prior = np.log((class_counts + 1.0) / (class_counts.sum() + n_classes))
+
+        smoothed = feature_counts + self.alpha
+        self.feature_log_prob = (np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))).astype(np.float32)
+
+        self.metadata = {
+            'format_version': MODEL_FORMAT_VERSION,
+            'trained_at': datetime.now().isoformat(),
+            'n_samples': len(pairs),
+            'class_counts': {category: int(count) for category, count in zip(self.categories, class_counts)}
+        }
+        return self
+
+    def predict_proba(self, emails):
+        """Return an (n_emails, n_categories) array of class probabilities"""
+        if not emails:
+            return np.zeros((0, len(self.categories)), dtype=np.float64)
+
+        rows, cols, counts = self.vectorizer.transform(emails)
+        joint = np.tile(self.class_log_prior, (len(emails), 1))
+        np.add.at(joint, rows, self.feature_log_prob[:, cols].T * counts[:, None])
+
+        joint -= joint.max(axis=1, keepdims=True)
+        probabilities = np.exp(joint)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def predict(self, emails, threshold):
+        """Return a category per email, or None where confidence is below threshold"""
+        probabilities = self.predict_proba(emails)
+        best = probabilities.argmax(axis=1) if len(emails) else []
+        return [
+            self.categories[b] if probabilities[i, b] >= threshold else None
+            for i, b in enumerate(best)
+        ]
+
+    def save(self, path):
+        """Write the model and its metadata to a versioned .npz artifact"""
+        metadata = dict(self.metadata, categories=self.categories,
+                        n_features=self.vectorizer.n_features, alpha=self.alpha)
+        np.savez_compressed(
+            path,
+            class_log_prior=self.class_log_prior,
+            feature_log_prob=self.feature_log_prob,
+            metadata=np.array(json.dumps(metadata))
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load an artifact written by save, rejecting incompatible versions"""
+        with np.load(path, allow_pickle=False) as artifact:
+            metadata = json.loads(str(artifact['metadata']))
+            if metadata.get('format_version') != MODEL_FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported local model version {metadata.get('format_version')}, "
+                    f"expected {MODEL_FORMAT_VERSION}"
+                )
+            model = cls(metadata['categories'], n_features=metadata['n_features'], alpha=metadata['alpha'])
+            model.class_log_prior = artifact['class_log_prior']
+            model.feature_log_prob = artifact['feature_log_prob']
+            model.metadata = metadata
+        logger.info(f"Loaded local classifier trained on {metadata.get('n_samples')} emails at {metadata.get('trained_at')}")
+        return model
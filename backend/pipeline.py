@@ -0,0 +1,186 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class PipelineStats:
+    """Process-wide per-stage counters shared by every pipeline run.
+
+    For each stage: items handled, errors, seconds spent working, seconds
+    spent blocked on a full downstream queue (backpressure), and the current
+    and peak depth of its input queue. The stage with the deepest queue and
+    the most busy time is the bottleneck.
+    """
+
+    FIELDS = ('items', 'errors', 'busy_seconds', 'blocked_seconds', 'queue_depth', 'max_queue_depth')
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def _stage(self, name):
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = dict.fromkeys(self.FIELDS, 0)
+        return stage
+
+    def record(self, name, **deltas):
+        with self._lock:
+            stage = self._stage(name)
+            for field, delta in deltas.items():
+                stage[field] += delta
+
+    def enqueued(self, name, delta):
+        with self._lock:
+            stage = self._stage(name)
+            stage['queue_depth'] += delta
+            stage['max_queue_depth'] = max(stage['max_queue_depth'], stage['queue_depth'])
+
+    def stats(self):
+        """Return counters per stage, with items per busy second as throughput"""
+        with self._lock:
+            stages = {name: dict(stage) for name, stage in self._stages.items()}
+        for stage in stages.values():
+            busy = stage['busy_seconds']
+            stage['throughput_per_second'] = round(stage['items'] / busy, 2) if busy else None
+            stage['busy_seconds'] = round(busy, 3)
+            stage['blocked_seconds'] = round(stage['blocked_seconds'], 3)
+        return stages
+
+
+class Pipeline:
+    """Runs items from a source through stages connected by bounded queues.
+
+    stages is a list of (name, func, workers); each stage has its own
+    threads and a bounded input queue, so a slow stage fills its queue and
+    holds back the stages before it instead of buffering without limit.
+    Results of the last stage are yielded, in completion order, to the
+    thread iterating the pipeline. The first exception in any stage stops
+    the source, lets in-flight work drain and is re-raised to the caller.
+    """
+
+    def __init__(self, source, stages, queue_size=4, stats=None, source_name='source'):
+        self.source = source
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.stats = stats or PipelineStats()
+        self.source_name = source_name
+        self._stop = threading.Event()
+        self._error = None
+        self._error_lock = threading.Lock()
+
+    def _fail(self, name, exc):
+        logger.error(f"Pipeline stage {name} failed: {exc}")
+        self.stats.record(name, errors=1)
+        with self._error_lock:
+            if self._error is None:
+                self._error = exc
+        self._stop.set()
+
+    def _put(self, name, out_queue, out_name, item):
+        # Time spent here is backpressure from the next stage
+        if out_name is not None:
+            self.stats.enqueued(out_name, 1)
+        start = time.monotonic()
+        out_queue.put(item)
+        self.stats.record(name, blocked_seconds=time.monotonic() - start)
+
+    def _run_source(self, out_queue, out_name, consumers):
+        try:
+            items = iter(self.source)
+            while not self._stop.is_set():
+                start = time.monotonic()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                finally:
+                    self.stats.record(self.source_name, busy_seconds=time.monotonic() - start)
+                self.stats.record(self.source_name, items=1)
+                self._put(self.source_name, out_queue, out_name, item)
+        except Exception as e:
+            self._fail(self.source_name, e)
+        finally:
+            for _ in range(consumers):
+                out_queue.put(_DONE)
+
+    def _run_stage(self, name, func, in_queue, out_queue, out_name, remaining, consumers):
+        while True:
+            item = in_queue.get()
+            if item is _DONE:
+                break
+            self.stats.enqueued(name, -1)
+            if self._stop.is_set():
+                # Drain without working so upstream threads never block
+                continue
+            start = time.monotonic()
+            try:
+                result = func(item)
+            except Exception as e:
+                self._fail(name, e)
+                continue
+            finally:
+                self.stats.record(name, busy_seconds=time.monotonic() - start)
+            self.stats.record(name, items=1)
+            self._put(name, out_queue, out_name, result)
+
+        # The stage's last worker to finish tells the next stage
+        with remaining['lock']:
+            remaining['count'] -= 1
+            last = remaining['count'] == 0
+        if last:
+            for _ in range(consumers):
+                out_queue.put(_DONE)
+
+    def __iter__(self):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = queue.Queue(maxsize=self.queue_size)
+        outputs = queues[1:] + [results]
+        names = [name for name, _, _ in self.stages]
+
+        threads = [threading.Thread(
+            target=self._run_source,
+            args=(queues[0], names[0], max(1, self.stages[0][2])),
+            name=f"pipeline-{self.source_name}",
+            daemon=True
+        )]
+        for i, (name, func, workers) in enumerate(self.stages):
+            workers = max(1, workers)
+            consumers = max(1, self.stages[i + 1][2]) if i + 1 < len(self.stages) else 1
+            out_name = names[i + 1] if i + 1 < len(self.stages) else None
+            remaining = {'count': workers, 'lock': threading.Lock()}
+            for n in range(workers):
+                threads.append(threading.Thread(
+                    target=self._run_stage,
+                    args=(name, func, queues[i], outputs[i], out_name, remaining, consumers),
+                    name=f"pipeline-{name}-{n}",
+                    daemon=True
+                ))
+        for thread in threads:
+            thread.start()
+
+        finished = False
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    finished = True
+                    break
+                yield item
+        finally:
+            if not finished:
+                # The consumer stopped early; stop the source and drain
+                self._stop.set()
+                while results.get() is not _DONE:
+                    pass
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
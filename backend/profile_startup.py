@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Profile how long importing the backend takes and fail if cold start regresses.
+
+Imports app.py in a fresh interpreter under `python -X importtime`, with the
+Google, Gemini and Supabase credentials removed from the environment, and
+checks that:
+  - the import succeeds without any credentials,
+  - none of the heavy client libraries are imported until a request needs them,
+  - the best of --runs imports stays under --budget-ms.
+
+Exits non-zero on any failure so it can run in CI next to the build.
+
+Usage:
+    python profile_startup.py
+    python profile_startup.py --budget-ms 1500 --runs 5 --top 25
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Loaded on first use by the lazy services in app.py, never at import
+DEFERRED_MODULES = [
+    'google.generativeai',
+    'google.api_core',
+    'google_auth_oauthlib',
+    'google_auth_httplib2',
+    'google.oauth2',
+    'googleapiclient',
+    'supabase',
+    'cryptography',
+    'numpy',
+    'httplib2',
+    'requests'
+]
+
+# Left out of the child's environment to prove the import does not need them
+CREDENTIAL_VARS = [
+    'GOOGLE_CLIENT_ID', 'GOOGLE_CLIENT_SECRET', 'GEMINI_API_KEY',
+    'SUPABASE_URL', 'SUPABASE_SERVICE_ROLE_KEY', 'ENCRYPTION_KEY'
+]
+
+
+def profile_import(module='app'):
+    """Import module in a fresh interpreter and return [(name, self_us, cumulative_us)]"""
+    env = {k: v for k, v in os.environ.items() if k not in CREDENTIAL_VARS}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def total_import_us(modules, module):
+    """Return the cumulative import time of module itself"""
+    return next((cumulative_us for name, _, cumulative_us in modules if name == module), 0)
+
+
+def deferred_imports(modules):
+    """Return the heavy modules that were imported anyway"""
+    names = {name for name, _, _ in modules}
+    return sorted(name for name in names
+                  if any(name == heavy or name.startswith(heavy + '.') for heavy in DEFERRED_MODULES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile backend import time")
+    parser.add_argument('--module', default='app', help="Module to import")
+    parser.add_argument('--budget-ms', type=float, default=1000,
+                        help="Fail if the fastest import takes longer than this")
+    parser.add_argument('--runs', type=int, default=3, help="Imports to run; the fastest is reported")
+    parser.add_argument('--top', type=int, default=15, help="Slowest modules to list")
+    args = parser.parse_args()
+
+    runs = [profile_import(args.module) for _ in range(max(1, args.runs))]
+    best = min(runs, key=lambda modules: total_import_us(modules, args.module))
+    total_ms = total_import_us(best, args.module) / 1000
+
+    print(f"Import of {args.module}: {total_ms:.1f} ms (best of {len(runs)}, budget {args.budget_ms:.0f} ms)")
+    print("\nSlowest modules by self time:")
+    for name, self_us, cumulative_us in sorted(best, key=lambda m: m[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+
+    failures = []
+    eager = deferred_imports(best)
+    if eager:
+        failures.append(f"Heavy modules imported at startup: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"Import took {total_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveRateLimiter:
+    """Process-wide token bucket whose rate adapts to quota feedback (AIMD).
+
+    Every caller blocks in acquire() until a token is available, so bursts
+    are queued rather than sent. A throttle signal multiplies the rate down
+    and pauses the whole bucket for the server-provided retry delay; each
+    recovery interval without throttling adds a fixed step back. Throttles
+    from requests already in flight when the rate dropped (during the
+    pause or within one recovery interval of the decrease) count as the
+    same congestion event and do not lower it again.
+    Rates are in requests per minute.
+    """
+
+    def __init__(self, initial_rpm=15, min_rpm=2, max_rpm=60, burst=5,
+                 increase_rpm=1, decrease_factor=0.5, recovery_interval=10):
+        self.min_rpm = min_rpm
+        self.max_rpm = max_rpm
+        self.burst = burst
+        self.increase_rpm = increase_rpm
+        self.decrease_factor = decrease_factor
+        self.recovery_interval = recovery_interval
+
+        self._rpm = min(max(initial_rpm, min_rpm), max_rpm)
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._last_adjustment = self._last_refill
+        self._blocked_until = 0.0
+        self._last_decrease = float('-inf')
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'acquired': 0,
+            'throttled': 0,
+            'decreases': 0,
+            'total_wait_seconds': 0.0,
+            'max_wait_seconds': 0.0
+        }
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self._rpm / 60.0)
+            self._last_refill = now
+
+    def acquire(self):
+        """Block until a request may be sent; returns the seconds spent waiting"""
+        start = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now >= self._blocked_until and self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    if now < self._blocked_until:
+                        timeout = self._blocked_until - now
+                    else:
+                        timeout = (1 - self._tokens) * 60.0 / self._rpm
+                    # Woken early by notify_all when the rate changes
+                    self._cond.wait(timeout)
+            finally:
+                self._waiting -= 1
+
+            waited = time.monotonic() - start
+            self._stats['acquired'] += 1
+            self._stats['total_wait_seconds'] += waited
+            self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], waited)
+        return waited
+
+    def on_success(self):
+        """Additive increase once per recovery interval without throttling"""
+        with self._cond:
+            now = time.monotonic()
+            if now >= self._blocked_until and now - self._last_adjustment >= self.recovery_interval:
+                self._refill(now)
+                self._rpm = min(self.max_rpm, self._rpm + self.increase_rpm)
+                self._last_adjustment = now
+                self._cond.notify_all()
+
+    def on_throttle(self, retry_delay=None):
+        """Multiplicative decrease, pausing every caller for retry_delay seconds if given"""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self._stats['throttled'] += 1
+            same_event = now < self._blocked_until or now - self._last_decrease < self.recovery_interval
+            if not same_event:
+                self._rpm = max(self.min_rpm, self._rpm * self.decrease_factor)
+                self._last_decrease = now
+                self._stats['decreases'] += 1
+            self._tokens = 0.0
+            if retry_delay:
+                self._blocked_until = max(self._blocked_until, now + retry_delay)
+            self._last_adjustment = max(now, self._blocked_until)
+            self._cond.notify_all()
+            if not same_event:
+                logger.warning(f"Gemini rate limited: rate now {self._rpm:.1f}/min, paused for {retry_delay or 0}s")
+
+    def stats(self):
+        """Return the current rate, queue depth and counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['rate_per_minute'] = round(self._rpm, 2)
+            stats['queue_depth'] = self._waiting
+            stats['paused_seconds'] = round(max(0.0, self._blocked_until - time.monotonic()), 2)
+        stats['total_wait_seconds'] = round(stats['total_wait_seconds'], 3)
+        stats['max_wait_seconds'] = round(stats['max_wait_seconds'], 3)
+        return stats
@@ -0,0 +1,115 @@
+import logging
+import threading
+from array import array
+from email.utils import parseaddr
+
+logger = logging.getLogger(__name__)
+
+# Second-level labels that sit under a country code, e.g. amazon.co.uk
+MULTI_PART_SUFFIXES = {
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'com.au', 'net.au', 'org.au', 'co.nz',
+    'co.in', 'co.jp', 'co.za', 'com.br', 'com.mx', 'com.ng', 'org.ng', 'gov.ng',
+    'edu.ng', 'com.gh', 'co.ke', 'com.sg', 'com.tr', 'com.cn', 'com.hk'
+}
+
+# Mailbox providers shared by unrelated people: only exact addresses are routed
+SHARED_MAIL_DOMAINS = {
+    'gmail.com', 'googlemail.com', 'yahoo.com', 'ymail.com', 'outlook.com',
+    'hotmail.com', 'live.com', 'msn.com', 'icloud.com', 'me.com', 'aol.com',
+    'proton.me', 'protonmail.com', 'gmx.com', 'mail.com', 'zoho.com'
+}
+
+
+def parse_sender(sender):
+    """Return (address, registrable_domain) for a From header, lowercased"""
+    address = parseaddr(sender or '')[1].strip().lower()
+    if '@' not in address:
+        return None, None
+
+    host = address.rsplit('@', 1)[1].strip('.')
+    labels = [label for label in host.split('.') if label]
+    if len(labels) < 2:
+        return address, host or None
+
+    suffix_length = 2 if '.'.join(labels[-2:]) in MULTI_PART_SUFFIXES else 1
+    domain = '.'.join(labels[-(suffix_length + 1):])
+    return address, domain
+
+
+class SenderIndex:
+    """Per-sender and per-domain category histograms built from past results.
+
+    Counts are stored as one compact unsigned-int array per key, indexed by
+    category position, so the index stays small even with many senders.
+    """
+
+    def __init__(self, categories, min_count=5, min_confidence=0.95):
+        self.categories = list(categories)
+        self._category_index = {category: i for i, category in enumerate(self.categories)}
+        self.min_count = min_count
+        self.min_confidence = min_confidence
+        self._addresses = {}
+        self._domains = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def _add(self, table, key, position, amount):
+        counts = table.get(key)
+        if counts is None:
+            counts = array('I', [0] * len(self.categories))
+            table[key] = counts
+        counts[position] += amount
+
+    def update(self, sender, category, amount=1):
+        """Record that sender's email was classified as category"""
+        position = self._category_index.get(category)
+        if position is None:
+            return
+        address, domain = parse_sender(sender)
+        if not address:
+            return
+        with self._lock:
+            self._add(self._addresses, address, position, amount)
+            if domain and domain not in SHARED_MAIL_DOMAINS:
+                self._add(self._domains, domain, position, amount)
+
+    def load(self, rows):
+        """Bulk-load rows of {'sender', 'category'} and mark the index as loaded"""
+        loaded = 0
+        for row in rows:
+            self.update(row.get('sender'), row.get('category'))
+            loaded += 1
+        self.loaded = True
+        logger.info(f"Sender index loaded {loaded} rows: {len(self._addresses)} senders, {len(self._domains)} domains")
+        return loaded
+
+    def _confident(self, counts):
+        if counts is None:
+            return None
+        total = sum(counts)
+        if total < self.min_count:
+            return None
+        best = max(range(len(counts)), key=counts.__getitem__)
+        if counts[best] / total >= self.min_confidence:
+            return self.categories[best]
+        return None
+
+    def lookup(self, sender):
+        """Return the category for sender if its history is confident enough, else None"""
+        address, domain = parse_sender(sender)
+        if not address:
+            return None
+        with self._lock:
+            category = self._confident(self._addresses.get(address))
+            if category is None and domain and domain not in SHARED_MAIL_DOMAINS:
+                category = self._confident(self._domains.get(domain))
+        return category
+
+    def stats(self):
+        """Return the index size"""
+        with self._lock:
+            return {
+                'loaded': self.loaded,
+                'senders': len(self._addresses),
+                'domains': len(self._domains)
+            }
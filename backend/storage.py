@@ -0,0 +1,356 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+STORAGE_REQUEST_SECONDS = Histogram(
+    'storage_request_seconds', 'Storage backend call latency by operation',
+    labels=('backend', 'operation', 'outcome')
+)
+
+
+class SupabaseStorage:
+    """Storage backed by the Supabase project described in database_schema.sql"""
+
+    def __init__(self, url, service_key):
+        # Imported here so SQLite-only deployments do not need the client
+        from supabase.client import create_client
+        self.client = create_client(url, service_key)
+
+    def get_user(self, user_id):
+        """Return the users row for user_id, or None"""
+        result = self.client.table('users').select('*').eq('user_id', user_id).execute()
+        return result.data[0] if result.data else None
+
+    def reserve_quota(self, user_id, requested, daily_limit, today, refund=0):
+        """Atomically reserve up to requested emails of today's quota; returns (reserved, remaining)"""
+        result = self.client.rpc('reserve_daily_quota', {
+            'p_user_id': user_id,
+            'p_requested': requested,
+            'p_daily_limit': daily_limit,
+            'p_today': today,
+            'p_refund': refund
+        }).execute()
+        row = result.data[0] if isinstance(result.data, list) else result.data
+        return row['reserved'], row['remaining']
+
+    def refund_quota(self, user_id, amount, day):
+        """Give back quota reserved on day"""
+        self.client.rpc('refund_daily_quota', {
+            'p_user_id': user_id,
+            'p_amount': amount,
+            'p_today': day
+        }).execute()
+
+    def get_sync_state(self, user_id):
+        """Return the gmail_sync_state row for user_id, or None"""
+        result = self.client.table('gmail_sync_state').select('*').eq('user_id', user_id).execute()
+        return result.data[0] if result.data else None
+
+    def save_sync_state(self, row):
+        """Insert or replace a gmail_sync_state row"""
+        self.client.table('gmail_sync_state').upsert(row, on_conflict='user_id').execute()
+
+    def get_classified_categories(self, user_id, message_ids):
+        """Return {email_id_from_gmail: category} for the given messages that are stored"""
+        result = self.client.table('classified_emails').select('email_id_from_gmail, category').eq(
+            'user_id', user_id
+        ).in_('email_id_from_gmail', list(message_ids)).execute()
+        return {row['email_id_from_gmail']: row['category'] for row in result.data or []}
+
+    def upsert_classified_emails(self, rows):
+        """Insert or update classified_emails rows keyed on (user_id, email_id_from_gmail)"""
+        self.client.table('classified_emails').upsert(rows, on_conflict='user_id,email_id_from_gmail').execute()
+
+    def _list_gemini_rows(self, columns, page_size):
+        # Offset paging needs a stable order or rows can repeat or go missing
+        rows = []
+        while True:
+            result = self.client.table('classified_emails').select(columns).eq(
+                'source', 'gemini'
+            ).order('id').range(
+                len(rows), len(rows) + page_size - 1
+            ).execute()
+            rows.extend(result.data or [])
+            if len(result.data or []) < page_size:
+                return rows
+
+    def list_sender_categories(self, page_size=1000):
+        """Return the (sender, category) pairs of emails Gemini classified, as dicts"""
+        return self._list_gemini_rows('sender, category', page_size)
+
+    def list_training_rows(self, page_size=1000):
+        """Return subject, sender, snippet and category of emails Gemini classified, as dicts"""
+        return self._list_gemini_rows('subject, sender, snippet, category', page_size)
+
+    def get_daily_summary(self, user_id, since):
+        """Return classification_daily_summary rows for user_id from the date since onwards"""
+        result = self.client.table('classification_daily_summary').select('day, category, email_count').eq(
+            'user_id', user_id
+        ).gte('day', since).order('day').execute()
+        return result.data or []
+
+
+# database_schema.sql translated to SQLite: same tables, keys, indexes and
+# triggers, with TEXT for dates and JSON
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    user_id TEXT UNIQUE NOT NULL,
+    encrypted_refresh_token TEXT,
+    daily_processed_count INTEGER DEFAULT 0,
+    last_processed_date TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_users_last_processed_date ON users(last_processed_date);
+
+CREATE TABLE IF NOT EXISTS classified_emails (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    user_id TEXT NOT NULL REFERENCES users(user_id),
+    email_id_from_gmail TEXT NOT NULL,
+    category TEXT NOT NULL,
+    subject TEXT,
+    sender TEXT,
+    snippet TEXT,
+    source TEXT,
+    classified_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_classified_emails_user_id ON classified_emails(user_id);
+CREATE INDEX IF NOT EXISTS idx_classified_emails_category ON classified_emails(category);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_classified_emails_user_gmail_id ON classified_emails(user_id, email_id_from_gmail);
+
+CREATE TABLE IF NOT EXISTS classification_daily_summary (
+    user_id TEXT NOT NULL REFERENCES users(user_id),
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    email_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, category)
+);
+
+CREATE TABLE IF NOT EXISTS gmail_sync_state (
+    user_id TEXT PRIMARY KEY REFERENCES users(user_id),
+    history_id TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT '{}',
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS update_users_updated_at AFTER UPDATE ON users
+BEGIN
+    UPDATE users SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS update_gmail_sync_state_updated_at AFTER UPDATE ON gmail_sync_state
+BEGIN
+    UPDATE gmail_sync_state SET updated_at = CURRENT_TIMESTAMP WHERE user_id = NEW.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS classification_daily_summary_insert AFTER INSERT ON classified_emails
+BEGIN
+    INSERT INTO classification_daily_summary (user_id, day, category, email_count)
+    VALUES (NEW.user_id, substr(NEW.classified_at, 1, 10), NEW.category, 1)
+    ON CONFLICT (user_id, day, category) DO UPDATE SET email_count = email_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS classification_daily_summary_update AFTER UPDATE ON classified_emails
+BEGIN
+    UPDATE classification_daily_summary SET email_count = email_count - 1
+    WHERE user_id = OLD.user_id AND day = substr(OLD.classified_at, 1, 10) AND category = OLD.category;
+    INSERT INTO classification_daily_summary (user_id, day, category, email_count)
+    VALUES (NEW.user_id, substr(NEW.classified_at, 1, 10), NEW.category, 1)
+    ON CONFLICT (user_id, day, category) DO UPDATE SET email_count = email_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS classification_daily_summary_delete AFTER DELETE ON classified_emails
+BEGIN
+    UPDATE classification_daily_summary SET email_count = email_count - 1
+    WHERE user_id = OLD.user_id AND day = substr(OLD.classified_at, 1, 10) AND category = OLD.category;
+END;
+"""
+
+
+class SQLiteStorage:
+    """Embedded storage in a local SQLite file (WAL mode) with the Supabase schema.
+
+    Reads and writes stay in-process, which suits single-node deployments,
+    tests and benchmarks. A single connection is shared behind a lock;
+    quota reservations run in an IMMEDIATE transaction so they are atomic
+    like the Postgres function they replace.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SQLITE_SCHEMA)
+        columns = {row['name'] for row in self._db.execute('PRAGMA table_info(classified_emails)')}
+        if 'source' not in columns:
+            # Files created before classified_emails.source existed
+            self._db.execute('ALTER TABLE classified_emails ADD COLUMN source TEXT')
+        self._lock = threading.Lock()
+        logger.info(f"SQLite storage enabled at {path}")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, params).fetchall()]
+
+    def _write(self, sql, params=(), many=False):
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                if many:
+                    self._db.executemany(sql, params)
+                else:
+                    self._db.execute(sql, params)
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def get_user(self, user_id):
+        """Return the users row for user_id, or None"""
+        rows = self._query('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        return rows[0] if rows else None
+
+    def reserve_quota(self, user_id, requested, daily_limit, today, refund=0):
+        """Atomically reserve up to requested emails of today's quota; returns (reserved, remaining)"""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.execute(
+                    'INSERT OR IGNORE INTO users (user_id, daily_processed_count, last_processed_date) VALUES (?, 0, ?)',
+                    (user_id, today)
+                )
+                row = self._db.execute(
+                    'SELECT daily_processed_count, last_processed_date FROM users WHERE user_id = ?', (user_id,)
+                ).fetchone()
+                used = max(0, (row['daily_processed_count'] or 0) - refund) if row['last_processed_date'] == today else 0
+                reserved = max(0, min(requested, daily_limit - used))
+                self._db.execute(
+                    'UPDATE users SET daily_processed_count = ?, last_processed_date = ? WHERE user_id = ?',
+                    (used + reserved, today, user_id)
+                )
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        return reserved, max(0, daily_limit - used - reserved)
+
+    def refund_quota(self, user_id, amount, day):
+        """Give back quota reserved on day"""
+        self._write(
+            'UPDATE users SET daily_processed_count = MAX(0, daily_processed_count - ?) '
+            'WHERE user_id = ? AND last_processed_date = ?',
+            (amount, user_id, day)
+        )
+
+    def get_sync_state(self, user_id):
+        """Return the gmail_sync_state row for user_id, or None"""
+        rows = self._query('SELECT * FROM gmail_sync_state WHERE user_id = ?', (user_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        row['state'] = json.loads(row['state'] or '{}')
+        return row
+
+    def save_sync_state(self, row):
+        """Insert or replace a gmail_sync_state row"""
+        self._write(
+            'INSERT INTO gmail_sync_state (user_id, history_id, state) VALUES (?, ?, ?) '
+            'ON CONFLICT (user_id) DO UPDATE SET history_id = excluded.history_id, state = excluded.state',
+            (row['user_id'], row['history_id'], json.dumps(row['state']))
+        )
+
+    def get_classified_categories(self, user_id, message_ids):
+        """Return {email_id_from_gmail: category} for the given messages that are stored"""
+        message_ids = list(message_ids)
+        if not message_ids:
+            return {}
+        placeholders = ','.join('?' * len(message_ids))
+        rows = self._query(
+            f'SELECT email_id_from_gmail, category FROM classified_emails '
+            f'WHERE user_id = ? AND email_id_from_gmail IN ({placeholders})',
+            [user_id] + message_ids
+        )
+        return {row['email_id_from_gmail']: row['category'] for row in rows}
+
+    def upsert_classified_emails(self, rows):
+        """Insert or update classified_emails rows keyed on (user_id, email_id_from_gmail)"""
+        self._write(
+            'INSERT INTO classified_emails '
+            '(user_id, email_id_from_gmail, category, subject, sender, snippet, source, classified_at) '
+            'VALUES (:user_id, :email_id_from_gmail, :category, :subject, :sender, :snippet, :source, :classified_at) '
+            'ON CONFLICT (user_id, email_id_from_gmail) DO UPDATE SET '
+            'category = excluded.category, subject = excluded.subject, sender = excluded.sender, '
+            'snippet = excluded.snippet, source = excluded.source, classified_at = excluded.classified_at',
+            rows,
+            many=True
+        )
+
+    def list_sender_categories(self, page_size=1000):
+        """Return the (sender, category) pairs of emails Gemini classified, as dicts"""
+        return self._query("SELECT sender, category FROM classified_emails WHERE source = 'gemini'")
+
+    def list_training_rows(self, page_size=1000):
+        """Return subject, sender, snippet and category of emails Gemini classified, as dicts"""
+        return self._query(
+            "SELECT subject, sender, snippet, category FROM classified_emails WHERE source = 'gemini' ORDER BY id"
+        )
+
+    def get_daily_summary(self, user_id, since):
+        """Return classification_daily_summary rows for user_id from the date since onwards"""
+        return self._query(
+            'SELECT day, category, email_count FROM classification_daily_summary '
+            'WHERE user_id = ? AND day >= ? ORDER BY day',
+            (user_id, since)
+        )
+
+
+class TimedStorage:
+    """Wraps a storage backend and records the latency of every method call"""
+
+    def __init__(self, storage, backend):
+        self.storage = storage
+        self.backend = backend
+        self._methods = {}
+
+    def __getattr__(self, name):
+        method = self._methods.get(name)
+        if method is not None:
+            return method
+        attr = getattr(self.storage, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = attr(*args, **kwargs)
+                outcome = 'success'
+                return result
+            finally:
+                STORAGE_REQUEST_SECONDS.labels(self.backend, name, outcome).observe(time.perf_counter() - start)
+
+        self._methods[name] = timed
+        return timed
+
+
+def create_storage(backend, supabase_url=None, supabase_key=None, sqlite_path=None):
+    """Build the storage backend named by backend ('supabase' or 'sqlite'), timing each call"""
+    if backend == 'sqlite':
+        return TimedStorage(SQLiteStorage(sqlite_path), backend)
+    if backend == 'supabase':
+        return TimedStorage(SupabaseStorage(supabase_url, supabase_key), backend)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
@@ -0,0 +1,161 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def record_fields(record):
+    """Return the extra= fields attached to a record"""
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, or as text with key=value fields.
+
+    Fields passed with extra= (e.g. event, user_id, counts) become keys of
+    the JSON object so log pipelines can filter and aggregate on them.
+    """
+
+    def __init__(self, structured=True, fmt=None):
+        super().__init__(fmt)
+        self.structured = structured
+
+    def format(self, record):
+        fields = record_fields(record)
+        if not self.structured:
+            text = super().format(record)
+            if fields:
+                text += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+            return text
+
+        payload = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        payload.update(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exception'] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Passes one in every `every` records for each sampled event.
+
+    Records are matched by their `event` field; records without one, or
+    with an event not in events, always pass. Kept records carry
+    sampled_every so readers can scale counts back up.
+    """
+
+    def __init__(self, events, every=100):
+        super().__init__()
+        self.events = set(events)
+        self.every = max(1, every)
+        self._counts = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+        if self.every == 1 or event not in self.events:
+            return True
+        with self._lock:
+            seen = self._counts.get(event, 0)
+            self._counts[event] = seen + 1
+            if seen % self.every:
+                self.dropped += 1
+                return False
+        record.sampled_every = self.every
+        return True
+
+
+class BackgroundLogHandler(logging.handlers.QueueHandler):
+    """Hands records to a background thread that formats and writes them.
+
+    Logging calls only append to a bounded queue; when it is full the
+    record is counted and dropped rather than blocking the caller. Message
+    arguments are formatted on the background thread, so pass values that
+    will not change after the call. The thread starts on the first record
+    in each process, which keeps it working in forked server workers.
+    close() (run by logging at exit) writes whatever is still queued.
+    """
+
+    def __init__(self, target, max_size=10000):
+        super().__init__(queue.Queue(max(1, max_size)))
+        self.target = target
+        self.max_size = max(1, max_size)
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._start_lock:
+            if self._pid != pid:
+                # A forked child inherits the queue but not the thread draining it
+                self.queue = queue.Queue(self.max_size)
+                self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._pid = pid
+
+    def prepare(self, record):
+        # Traceback objects hold frames alive, so render them now; the
+        # message itself is left for the background thread
+        if record.exc_info:
+            record.exc_text = self.target.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        with self._start_lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
+        self.target.close()
+        super().close()
+
+    def stats(self):
+        """Return queued and dropped record counts"""
+        stats = {'queued': self.queue.qsize(), 'dropped_queue_full': self.dropped}
+        for log_filter in self.filters:
+            if isinstance(log_filter, SamplingFilter):
+                stats['dropped_sampled'] = log_filter.dropped
+        return stats
+
+
+def configure_logging(level='INFO', structured=True, fmt=None, queue_size=10000,
+                      sampled_events=(), sample_every=100):
+    """Route the root logger through a BackgroundLogHandler writing to stderr and return the handler"""
+    target = logging.StreamHandler()
+    target.setFormatter(StructuredFormatter(structured=structured, fmt=fmt))
+    handler = BackgroundLogHandler(target, max_size=queue_size)
+    if sampled_events:
+        handler.addFilter(SamplingFilter(sampled_events, every=sample_every))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+        existing.close()
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
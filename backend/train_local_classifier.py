@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Train the local first-pass classifier from past classification results.
+
+Reads the rows Gemini classified from the classified_emails table of the
+configured storage backend (STORAGE_BACKEND), or reads a JSON Lines export
+with subject/sender/snippet/category fields, and writes a versioned model
+artifact that the backend loads at startup. Rows answered by the sender
+index or by the model itself are left out so it never trains on its own
+predictions.
+
+Usage:
+    python train_local_classifier.py
+    python train_local_classifier.py --input export.jsonl --output models/local_classifier.npz
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# Before config, which reads the environment when imported
+load_dotenv()
+
+from config import config
+from local_classifier import LocalClassifier
+from storage import create_storage
+
+
+def load_rows_from_storage(settings):
+    """Fetch the Gemini-labelled classified_emails rows from the configured storage backend"""
+    if settings.STORAGE_BACKEND == 'supabase':
+        url = os.environ.get('SUPABASE_URL')
+        key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+        if not url or not key:
+            raise SystemExit("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are required to read from Supabase")
+    else:
+        url = key = None
+    storage = create_storage(settings.STORAGE_BACKEND, supabase_url=url, supabase_key=key,
+                             sqlite_path=settings.SQLITE_DB_PATH)
+    return storage.list_training_rows()
+
+
+def load_rows_from_file(path):
+    """Read rows from a JSON Lines file"""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    settings = config['default']
+
+    parser = argparse.ArgumentParser(description="Train the local email classifier")
+    parser.add_argument('--input', help="JSON Lines export to train from instead of the storage backend")
+    parser.add_argument('--output', default=settings.LOCAL_MODEL_PATH or 'models/local_classifier.npz',
+                        help="Where to write the model artifact")
+    parser.add_argument('--n-features', type=int, default=2 ** 17, help="Number of hashed feature columns")
+    parser.add_argument('--alpha', type=float, default=0.1, help="Additive smoothing")
+    parser.add_argument('--holdout', type=float, default=0.1, help="Fraction of rows held out for evaluation")
+    args = parser.parse_args()
+
+    rows = load_rows_from_file(args.input) if args.input else load_rows_from_storage(settings)
+    rows = [row for row in rows if row.get('category') in settings.EMAIL_CATEGORIES]
+    print(f"Loaded {len(rows)} labelled rows")
+    if not rows:
+        sys.exit(1)
+
+    # Deterministic holdout so repeated runs are comparable
+    holdout_every = int(1 / args.holdout) if args.holdout > 0 else 0
+    train = [row for i, row in enumerate(rows) if not holdout_every or i % holdout_every]
+    test = [row for i, row in enumerate(rows) if holdout_every and not i % holdout_every]
+
+    model = LocalClassifier(settings.EMAIL_CATEGORIES, n_features=args.n_features, alpha=args.alpha)
+    model.fit(train, [row['category'] for row in train])
+
+    if test:
+        probabilities = model.predict_proba(test)
+        predicted = probabilities.argmax(axis=1)
+        confidence = probabilities.max(axis=1)
+        correct = [model.categories[p] == row['category'] for p, row in zip(predicted, test)]
+        print(f"Holdout accuracy: {sum(correct) / len(test):.3f} on {len(test)} rows")
+        threshold = settings.LOCAL_MODEL_THRESHOLD
+        confident = [c for c, conf in zip(correct, confidence) if conf >= threshold]
+        if confident:
+            print(f"At threshold {threshold}: {len(confident) / len(test):.1%} coverage, "
+                  f"{sum(confident) / len(confident):.3f} accuracy")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    model.save(args.output)
+    print(f"Wrote model to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
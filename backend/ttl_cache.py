@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Distinguishes "not cached" from a cached None
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded in-process LRU whose entries expire after ttl_seconds.
+
+    Used as a read-through cache in front of Supabase rows: callers load on
+    a miss and set the result, and invalidate a key whenever they write the
+    underlying row. None is a valid cached value (e.g. "no such user").
+    Pass the generation() taken before the load to set() so a row read
+    before a concurrent invalidate is not cached after it.
+    """
+
+    def __init__(self, max_size=1000, ttl_seconds=30):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._generation = 0
+        self._invalidated = OrderedDict()  # key -> generation of its last invalidate, at most max_size
+        self._forgotten = 0  # Newest generation dropped from _invalidated
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'stale_sets': 0, 'invalidations': 0,
+                       'evictions': 0, 'expirations': 0}
+
+    def get(self, key, default=_MISSING):
+        """Return the cached value for key, or default (a sentinel if omitted) on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                del self._entries[key]
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+        return default
+
+    def is_miss(self, value):
+        """Return True if value is the miss sentinel returned by get()"""
+        return value is _MISSING
+
+    def generation(self):
+        """Return a token to pass to set() for a value about to be loaded"""
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, generation=None):
+        """Cache value for key for ttl_seconds, unless key was invalidated after generation"""
+        with self._lock:
+            if generation is not None and (self._invalidated.get(key, 0) > generation or self._forgotten > generation):
+                self._stats['stale_sets'] += 1
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            self._stats['sets'] += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key):
+        """Drop key so the next read goes to the source"""
+        with self._lock:
+            self._generation += 1
+            self._invalidated[key] = self._generation
+            self._invalidated.move_to_end(key)
+            if len(self._invalidated) > self.max_size:
+                # Loads started before this generation can no longer be checked; skip them
+                _, self._forgotten = self._invalidated.popitem(last=False)
+            if self._entries.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        """Return hit/miss counters, hit ratio and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
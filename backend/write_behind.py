@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Buffers rows and writes them in batches on a background thread.
+
+    Rows are flushed batch_size at a time, as soon as a full batch is waiting
+    or flush_interval seconds after the last flush. When key(row) is given,
+    rows sharing a key within a batch are written once, keeping the last,
+    and pending() finds rows not written yet. A failed batch is logged and
+    retried on the next flush, up to max_attempts writes, then dropped.
+    At most max_rows rows are held; callers adding more wait up to
+    add_timeout seconds for the flusher to catch up, then add anyway so a
+    stalled writer cannot block them. close() stops the thread and flushes
+    whatever is left, so register it to run at exit.
+
+    flush_rows(rows) performs the write and should raise on failure.
+    """
+
+    def __init__(self, flush_rows, batch_size=500, flush_interval=2.0, max_rows=10000,
+                 key=None, max_attempts=5, add_timeout=30.0):
+        self.flush_rows = flush_rows
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_rows = max(self.batch_size, max_rows)
+        self.key = key
+        self.max_attempts = max(1, max_attempts)
+        self.add_timeout = add_timeout
+        self._rows = []
+        self._batch = None  # Taken from _rows and not written yet
+        self._batch_attempts = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # One flush at a time, background or explicit
+        self._thread = None
+        self._closed = False
+        self._stats = {
+            'rows_added': 0,
+            'rows_flushed': 0,
+            'flushes': 0,
+            'failures': 0,
+            'dropped_rows': 0,
+            'duplicate_rows': 0,
+            'blocked_adds': 0,
+            'overfull_adds': 0,
+            'total_flush_seconds': 0.0,
+            'max_flush_seconds': 0.0
+        }
+
+    def _start(self):
+        # Caller holds the lock; the thread starts on first use, not at import
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def add_rows(self, rows):
+        """Queue rows for writing, waiting up to add_timeout seconds while the buffer is full"""
+        rows = list(rows)
+        if not rows:
+            return
+        with self._cond:
+            if self._rows and len(self._rows) + len(rows) > self.max_rows:
+                self._stats['blocked_adds'] += 1
+                # A full buffer holds at least one batch, which wakes the flusher
+                self._cond.notify_all()
+                if not self._cond.wait_for(
+                    lambda: not self._rows or len(self._rows) + len(rows) <= self.max_rows or self._closed,
+                    timeout=self.add_timeout
+                ):
+                    # Holding rows past the limit beats losing them or stalling the run
+                    self._stats['overfull_adds'] += 1
+                    logger.warning(f"Write-behind buffer still full after {self.add_timeout}s, "
+                                   f"adding {len(rows)} rows past the limit")
+            self._rows.extend(rows)
+            self._stats['rows_added'] += len(rows)
+            self._start()
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify_all()
+
+    def pending(self, keys):
+        """Return {key: row} for rows with one of keys that are not written yet; the latest row wins"""
+        if self.key is None:
+            return {}
+        keys = set(keys)
+        with self._cond:
+            rows = (self._batch or []) + self._rows
+        found = {}
+        for row in rows:
+            row_key = self.key(row)
+            if row_key in keys:
+                found[row_key] = row
+        return found
+
+    def _unique(self, rows):
+        # Postgres rejects an upsert that touches the same key twice
+        if self.key is None:
+            return rows
+        unique = {}
+        for row in rows:
+            unique[self.key(row)] = row
+        return list(unique.values())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or len(self._rows) >= self.batch_size,
+                    timeout=self.flush_interval
+                )
+                if self._closed:
+                    return
+                pending = bool(self._rows or self._batch)
+            if pending and not self._flush_once():
+                # Back off before retrying a failed write
+                with self._cond:
+                    self._cond.wait_for(lambda: self._closed, timeout=self.flush_interval)
+
+    def _flush_once(self):
+        """Write one batch of rows; returns False if nothing was written or the write failed"""
+        with self._flush_lock:
+            with self._cond:
+                if self._batch is None:
+                    # A failed batch is retried before any newer rows
+                    taken = self._rows[:self.batch_size]
+                    del self._rows[:self.batch_size]
+                    self._batch = self._unique(taken)
+                    self._batch_attempts = 0
+                    self._stats['duplicate_rows'] += len(taken) - len(self._batch)
+                    self._cond.notify_all()  # Room for blocked add_rows callers
+                rows = self._batch
+            if not rows:
+                with self._cond:
+                    self._batch = None
+                return False
+
+            start = time.monotonic()
+            rows_flushed = 0
+            failures = 0
+            try:
+                self.flush_rows(rows)
+                rows_flushed = len(rows)
+                with self._cond:
+                    self._batch = None
+            except Exception as e:
+                failures += 1
+                with self._cond:
+                    self._batch_attempts += 1
+                    if self._batch_attempts >= self.max_attempts:
+                        logger.error(f"Write-behind flush of {len(rows)} rows failed "
+                                     f"{self._batch_attempts} times, dropping them: {e}")
+                        self._stats['dropped_rows'] += len(rows)
+                        self._batch = None
+                    else:
+                        logger.error(f"Write-behind flush of {len(rows)} rows failed "
+                                     f"(attempt {self._batch_attempts} of {self.max_attempts}): {e}")
+            elapsed = time.monotonic() - start
+
+            with self._cond:
+                self._stats['flushes'] += 1
+                self._stats['rows_flushed'] += rows_flushed
+                self._stats['failures'] += failures
+                self._stats['total_flush_seconds'] += elapsed
+                self._stats['max_flush_seconds'] = max(self._stats['max_flush_seconds'], elapsed)
+            return failures == 0
+
+    def flush(self):
+        """Write everything buffered now, stopping at the first failed write"""
+        while self._flush_once():
+            pass
+
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.flush()
+        with self._cond:
+            backlog = len(self._rows) + len(self._batch or [])
+        if backlog:
+            logger.error(f"Write-behind buffer closed with {backlog} unwritten rows")
+
+    def stats(self):
+        """Return backlog sizes, flush counts and flush latency"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['backlog_rows'] = len(self._rows) + len(self._batch or [])
+        flushes = stats['flushes']
+        stats['avg_flush_seconds'] = round(stats['total_flush_seconds'] / flushes, 3) if flushes else None
+        stats['total_flush_seconds'] = round(stats['total_flush_seconds'], 3)
+        stats['max_flush_seconds'] = round(stats['max_flush_seconds'], 3)
+        return stats
@@ -16,8 +16,7 @@ CREATE TABLE IF NOT EXISTS users (
 CREATE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id);
 CREATE INDEX IF NOT EXISTS idx_users_last_processed_date ON users(last_processed_date);
 
--- Optional: Create table for storing classification results (for future features)
--- This table is not used in the MVP but can be useful for analytics
+-- Create table for storing classification results (one row per classified Gmail message)
 CREATE TABLE IF NOT EXISTS classified_emails (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
     user_id TEXT NOT NULL REFERENCES users(user_id),
@@ -26,16 +25,41 @@ CREATE TABLE IF NOT EXISTS classified_emails (
     subject TEXT,
     sender TEXT,
     snippet TEXT,
+    source TEXT, -- Which stage answered: 'gemini', 'sender_index' or 'local_model'
     classified_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Add the source column to tables created before it existed
+ALTER TABLE classified_emails ADD COLUMN IF NOT EXISTS source TEXT;
+
 -- Create index for classified_emails
 CREATE INDEX IF NOT EXISTS idx_classified_emails_user_id ON classified_emails(user_id);
 CREATE INDEX IF NOT EXISTS idx_classified_emails_category ON classified_emails(category);
+-- One row per Gmail message per user; the backend upserts on this key
+CREATE UNIQUE INDEX IF NOT EXISTS idx_classified_emails_user_gmail_id ON classified_emails(user_id, email_id_from_gmail);
+
+-- Create table of per-user, per-day category counts, maintained by a trigger on classified_emails
+CREATE TABLE IF NOT EXISTS classification_daily_summary (
+    user_id TEXT NOT NULL REFERENCES users(user_id),
+    day DATE NOT NULL,
+    category TEXT NOT NULL,
+    email_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, category)
+);
+
+-- Create table for incremental inbox sync (last Gmail historyId and tracked messages per user)
+CREATE TABLE IF NOT EXISTS gmail_sync_state (
+    user_id TEXT PRIMARY KEY REFERENCES users(user_id),
+    history_id TEXT NOT NULL,
+    state JSONB NOT NULL DEFAULT '{}'::jsonb, -- {"messages": [[id, category, unread, date], ...], "pending": [id, ...], "scan": {"page_token": ..., "budget": n}}
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
 
 -- Enable Row Level Security (RLS) for security
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE classified_emails ENABLE ROW LEVEL SECURITY;
+ALTER TABLE gmail_sync_state ENABLE ROW LEVEL SECURITY;
+ALTER TABLE classification_daily_summary ENABLE ROW LEVEL SECURITY;
 
 -- Create policies for RLS (users can only access their own data)
 CREATE POLICY "Users can view own data" ON users
@@ -62,3 +86,93 @@ $$ language 'plpgsql';
 -- Create trigger to automatically update updated_at
 CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_gmail_sync_state_updated_at BEFORE UPDATE ON gmail_sync_state
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Keep classification_daily_summary in step with every classified_emails write
+CREATE OR REPLACE FUNCTION update_classification_daily_summary()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE classification_daily_summary
+        SET email_count = email_count - 1
+        WHERE user_id = OLD.user_id
+          AND day = OLD.classified_at::date
+          AND category = OLD.category;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO classification_daily_summary (user_id, day, category, email_count)
+        VALUES (NEW.user_id, NEW.classified_at::date, NEW.category, 1)
+        ON CONFLICT (user_id, day, category)
+        DO UPDATE SET email_count = classification_daily_summary.email_count + 1;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER update_classification_daily_summary AFTER INSERT OR UPDATE OR DELETE ON classified_emails
+    FOR EACH ROW EXECUTE FUNCTION update_classification_daily_summary();
+
+-- Backfill the summary from rows classified before the trigger existed
+INSERT INTO classification_daily_summary (user_id, day, category, email_count)
+SELECT user_id, classified_at::date, category, COUNT(*)
+FROM classified_emails
+GROUP BY user_id, classified_at::date, category
+ON CONFLICT (user_id, day, category) DO NOTHING;
+
+-- Atomically reserve up to p_requested emails of a user's daily quota.
+-- p_refund returns quota an earlier run today did not use.
+-- Locks the user's row, resets the count when p_today is a new day and never
+-- grants past p_daily_limit, so concurrent requests cannot overshoot it.
+CREATE OR REPLACE FUNCTION reserve_daily_quota(
+    p_user_id TEXT,
+    p_requested INTEGER,
+    p_daily_limit INTEGER,
+    p_today DATE,
+    p_refund INTEGER DEFAULT 0 -- Unused quota from earlier runs today, given back in the same call
+)
+RETURNS TABLE (reserved INTEGER, remaining INTEGER) AS $$
+DECLARE
+    v_used INTEGER;
+    v_reserved INTEGER;
+BEGIN
+    INSERT INTO users (user_id, daily_processed_count, last_processed_date)
+    VALUES (p_user_id, 0, p_today)
+    ON CONFLICT (user_id) DO NOTHING;
+
+    SELECT CASE
+        WHEN u.last_processed_date = p_today THEN GREATEST(0, COALESCE(u.daily_processed_count, 0) - p_refund)
+        ELSE 0
+    END
+    INTO v_used
+    FROM users u
+    WHERE u.user_id = p_user_id
+    FOR UPDATE;
+
+    v_reserved := GREATEST(0, LEAST(p_requested, p_daily_limit - v_used));
+
+    UPDATE users
+    SET daily_processed_count = v_used + v_reserved,
+        last_processed_date = p_today
+    WHERE user_id = p_user_id;
+
+    RETURN QUERY SELECT v_reserved, GREATEST(0, p_daily_limit - v_used - v_reserved);
+END;
+$$ language 'plpgsql';
+
+-- Give back quota reserved on p_today that a run did not use
+CREATE OR REPLACE FUNCTION refund_daily_quota(
+    p_user_id TEXT,
+    p_amount INTEGER,
+    p_today DATE
+)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE users
+    SET daily_processed_count = GREATEST(0, daily_processed_count - p_amount)
+    WHERE user_id = p_user_id AND last_processed_date = p_today;
+END;
+$$ language 'plpgsql';
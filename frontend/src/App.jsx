@@ -40,6 +40,9 @@ const Landing = () => {
     </div>
   )
 }
+// How often the dashboard checks on a running classification job
+const JOB_POLL_INTERVAL_MS = 1000
+
 const Dashboard = () => {
   const { logout, isAuthenticated, loading } = useAuth()
   const navigate = useNavigate()
@@ -71,32 +74,121 @@ const Dashboard = () => {
     }
   }
 
+  // Follow a queued job by polling its status until it finishes
+  const pollJob = async (jobId) => {
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+      const jobResponse = await fetch(`${import.meta.env.VITE_API_URL}/api/jobs/${jobId}`, {
+        credentials: 'include'
+      })
+      const job = await jobResponse.json()
+      
+      if (!jobResponse.ok) {
+        setError(job.error || 'Failed to classify emails')
+        return
+      }
+      if (job.status === 'succeeded' || (job.status === 'cancelled' && job.result)) {
+        setClassificationData(job.result)
+        setHasClassified(true)
+        return
+      }
+      if (job.status === 'failed' || job.status === 'cancelled') {
+        setError(job.error ? `Failed to classify emails: ${job.error}` : 'Classification was cancelled')
+        return
+      }
+      if (job.progress) {
+        // Show running counts while the job is still going
+        setClassificationData(job.progress)
+        setHasClassified(true)
+      }
+    }
+  }
+  
+  // Queue a classification job; returns its ID, or null after reporting why it was refused
+  const queueJob = async () => {
+    const response = await fetch(`${import.meta.env.VITE_API_URL}/api/emails/classify`, {
+      method: 'POST',
+      credentials: 'include',
+      headers: {
+        'Content-Type': 'application/json'
+      }
+    })
+    
+    const data = await response.json()
+    
+    if (!response.ok) {
+      if (data.limit_reached) {
+        setError(`Daily limit of ${data.daily_limit} emails reached. Please try again tomorrow.`)
+      } else {
+        setError(data.error || 'Failed to classify emails')
+      }
+      return null
+    }
+    return data.job_id
+  }
+  
+  // Stream the job's progress so counts fill in as it runs. Resolves with
+  // true once the job has finished, or false when the stream fails and the
+  // caller should poll instead
+  const streamJob = (jobId) => new Promise((resolve) => {
+    const source = new EventSource(
+      `${import.meta.env.VITE_API_URL}/api/emails/classify/stream?job_id=${encodeURIComponent(jobId)}`,
+      { withCredentials: true }
+    )
+    
+    const finish = (finished) => {
+      source.close()
+      resolve(finished)
+    }
+    
+    source.addEventListener('progress', (event) => {
+      setClassificationData(JSON.parse(event.data))
+      setHasClassified(true)
+    })
+    
+    source.addEventListener('summary', (event) => {
+      setClassificationData(JSON.parse(event.data))
+      setHasClassified(true)
+      finish(true)
+    })
+    
+    source.addEventListener('cancelled', (event) => {
+      const data = JSON.parse(event.data)
+      if (data.categories) {
+        setClassificationData(data)
+        setHasClassified(true)
+      } else {
+        setError('Classification was cancelled')
+      }
+      finish(true)
+    })
+    
+    source.addEventListener('failed', (event) => {
+      const data = JSON.parse(event.data)
+      setError(data.details ? `Failed to classify emails: ${data.details}` : data.error)
+      finish(true)
+    })
+    
+    // EventSource would keep reconnecting on its own; poll the job instead
+    source.onerror = () => finish(false)
+  })
+  
   const classifyEmails = async () => {
     setIsClassifying(true)
     setError(null)
     
     try {
-      const response = await fetch(`${import.meta.env.VITE_API_URL}/api/emails/classify`, {
-        method: 'POST',
-        credentials: 'include',
-        headers: {
-          'Content-Type': 'application/json'
+      // Classification runs as a background job; follow it over the
+      // progress stream, falling back to polling its status
+      const jobId = await queueJob()
+      if (jobId) {
+        const finished = typeof EventSource !== 'undefined' && await streamJob(jobId)
+        if (!finished) {
+          await pollJob(jobId)
         }
-      })
-      
-      const data = await response.json()
-      
-      if (response.ok) {
-        setClassificationData(data)
-        setHasClassified(true)
+        
         // Refresh usage data after classification
         await fetchUsageData()
-      } else {
-        if (data.limit_reached) {
-          setError(`Daily limit of ${data.daily_limit} emails reached. Please try again tomorrow.`)
-        } else {
-          setError(data.error || 'Failed to classify emails')
-        }
       }
     } catch (error) {
       console.error('Error classifying emails:', error)